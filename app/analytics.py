@@ -0,0 +1,158 @@
+import math
+import os
+import threading
+
+# Presses faster than this after the round was armed can't be a reaction to
+# anything, they count as false starts and stay out of the reaction times
+FALSE_START_MS = float(os.environ.get("PARTY_FALSE_START_MS", 100))
+
+# Reaction times go into log-spaced buckets, each 10% wider than the last,
+# from 1 ms up to about 10 minutes. Percentiles come out as bucket bounds so
+# they're within 10%, and updating or reading them doesn't depend on how many
+# rounds there are.
+BUCKET_GROWTH = 1.1
+BUCKETS = 140
+
+
+def bucket_index(ms):
+    if ms < 1:
+        return 0
+    return min(BUCKETS - 1, 1 + int(math.log(ms) / math.log(BUCKET_GROWTH)))
+
+
+def bucket_bound(index):
+    return BUCKET_GROWTH ** index
+
+
+class PlayerStats:
+    def __init__(self, name):
+        self.name = name
+        self.rounds = 0
+        self.wins = 0
+        self.false_starts = 0
+        self.reactions = 0
+        self.reaction_sum_ms = 0.0
+        self.best_ms = None
+        self.histogram = [0] * BUCKETS
+        self.streak = 0  # Consecutive wins up to the latest round
+        self.best_streak = 0
+
+    def add_reaction(self, ms):
+        if ms < FALSE_START_MS:
+            self.false_starts += 1
+            return
+        self.reactions += 1
+        self.reaction_sum_ms += ms
+        self.best_ms = ms if self.best_ms is None else min(self.best_ms, ms)
+        self.histogram[bucket_index(ms)] += 1
+
+    def percentile(self, q):
+        if not self.reactions:
+            return None
+        target = q * self.reactions
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target:
+                return bucket_bound(index)
+        return bucket_bound(BUCKETS - 1)
+
+    def info(self):
+        return {
+            "user": self.name,
+            "rounds": self.rounds,
+            "wins": self.wins,
+            "win_rate": self.wins / self.rounds if self.rounds else 0.0,
+            "false_starts": self.false_starts,
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+            "reaction_ms": {
+                "count": self.reactions,
+                "mean": self.reaction_sum_ms / self.reactions if self.reactions else None,
+                "best": self.best_ms,
+                "p50": self.percentile(0.50),
+                "p90": self.percentile(0.90),
+            },
+        }
+
+
+class RoomAnalytics:
+    # Running totals for one room, fed each saved round once in order
+    def __init__(self, room):
+        self.room = room
+        self.players: dict[str, PlayerStats] = {}
+        self.last_number = 0
+        self.rounds = 0
+        self.last_winner = None
+
+    def player(self, name):
+        stats = self.players.get(name)
+        if stats is None:
+            stats = self.players[name] = PlayerStats(name)
+        return stats
+
+    def add_round(self, saved_round):
+        self.last_number = saved_round["number"]
+        self.rounds += 1
+        armed_ns = saved_round.get("armed_ns")
+        seen = set()
+        for press in saved_round["presses"]:
+            stats = self.player(press["user"])
+            if press["user"] not in seen:
+                seen.add(press["user"])
+                stats.rounds += 1
+                # Only a player's first press is their reaction
+                if armed_ns is not None:
+                    stats.add_reaction((press["corrected_ns"] - armed_ns) / 1e6)
+
+        winner = saved_round["winner"]
+        if winner is not None:
+            stats = self.player(winner)
+            stats.wins += 1
+            stats.streak = stats.streak + 1 if self.last_winner == winner else 1
+            stats.best_streak = max(stats.best_streak, stats.streak)
+        if self.last_winner is not None and self.last_winner != winner:
+            self.players[self.last_winner].streak = 0
+        self.last_winner = winner
+
+    def leaderboard(self):
+        players = sorted(self.players.values(), key=lambda stats: (-stats.wins, -stats.best_streak, stats.name))
+        return {"room": self.room, "rounds": self.rounds, "players": [stats.info() for stats in players]}
+
+
+class Analytics:
+    # Keeps a RoomAnalytics per room in step with the history store. Each
+    # read only pulls the rounds saved since the last one, so the history is
+    # scanned once per process and every new round is added exactly once.
+    def __init__(self, store, page_size=500):
+        self.store = store
+        self.page_size = page_size
+        self.rooms: dict[str, RoomAnalytics] = {}
+        self.lock = threading.Lock()
+
+    def room(self, name):
+        with self.lock:
+            analytics = self.rooms.get(name)
+            if analytics is None:
+                analytics = self.rooms[name] = RoomAnalytics(name)
+            while True:
+                rounds = self.store.page(name, after=analytics.last_number, limit=self.page_size)
+                for saved_round in rounds:
+                    analytics.add_round(saved_round)
+                if len(rounds) < self.page_size:
+                    return analytics
+
+    def leaderboard(self, name):
+        return self.room(name).leaderboard()
+
+
+def format_player(rank, info):
+    text = f"{rank}. {info['user']}  {info['wins']} wins"
+    if info["best_streak"] > 1:
+        text += f"  best streak {info['best_streak']}"
+    reaction = info["reaction_ms"]
+    if reaction["p50"] is not None:
+        text += f"  median {reaction['p50']:.0f} ms  p90 {reaction['p90']:.0f} ms"
+    if info["false_starts"]:
+        text += f"  false starts {info['false_starts']}"
+    return text
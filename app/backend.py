@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process in events, so e.g. only the worker that took a save
+# request writes the round to the history store. The random part keeps it
+# from matching an earlier run's events in a journal when a PID is reused.
+WORKER_ID = f"{os.getpid()}-{secrets.token_hex(2)}"
+
+
+class MemoryBackend:
+    # Single process: an event is applied the moment it's published
+    shared = False
+
+    def __init__(self):
+        self.dispatch = None  # Set by the room registry
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def publish(self, room, event):
+        self.dispatch(room, event)
+
+    def last_number(self, room):
+        # Nothing outlives the process but the history store
+        return None
+
+
+class SqliteBackend:
+    # Ordered event log in a SQLite file shared by every worker process on the
+    # machine. Workers append room events and each one applies the whole log in
+    # id order, so all of them arrive at the same round state and fan presses
+    # out to their own sockets in the same order. Anything that offers an
+    # ordered append-only log (a Redis stream, say) can stand in for this by
+    # providing the same start/stop/publish methods.
+    shared = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        room TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path, poll_interval=0.005):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.conn = None
+        self.dispatch = None  # Set by the room registry
+        self.last_id = 0
+        self.wakeup = None
+        self.poller = None
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    def reset(self):
+        # Called once before the workers start, a new session starts empty
+        conn = self.connect()
+        conn.execute("DELETE FROM events")
+        conn.close()
+
+    async def start(self):
+        self.conn = self.connect()
+        self.wakeup = asyncio.Event()
+        # Catch up with whatever the other workers already did
+        self.poll()
+        self.poller = asyncio.create_task(self.poll_loop())
+
+    async def stop(self):
+        if self.poller:
+            self.poller.cancel()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def publish(self, room, event):
+        self.conn.execute(
+            "INSERT INTO events (room, data, created) VALUES (?, ?, ?)",
+            (room, json.dumps(event), time.time()),
+        )
+        # Our own events shouldn't wait for the next poll tick
+        self.wakeup.set()
+
+    def last_number(self, room):
+        # Number of the latest save applied here for the room, None if there
+        # wasn't one this session
+        if self.conn is None:
+            return None
+        row = self.conn.execute(
+            "SELECT MAX(json_extract(data, '$.number')) FROM events "
+            "WHERE room = ? AND id <= ? AND json_extract(data, '$.kind') = 'save'",
+            (room, self.last_id),
+        ).fetchone()
+        return row[0]
+
+    def poll(self):
+        rows = self.conn.execute(
+            "SELECT id, room, data FROM events WHERE id > ? ORDER BY id", (self.last_id,)
+        ).fetchall()
+        for event_id, room, data in rows:
+            self.last_id = event_id
+            try:
+                self.dispatch(room, json.loads(data))
+            except Exception as e:
+                logger.error("Failed to apply event %s for %s: %r", event_id, room, e)
+
+    async def poll_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            self.poll()
+
+
+BACKENDS = ("memory", "sqlite")
+
+
+def create_backend(name, path=None, poll_interval=0.005):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SqliteBackend(path or "party_state.db", poll_interval)
+    raise ValueError(f"Unknown state backend: {name}")
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from collections import deque
+from fastapi import WebSocket
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# What to do with a client whose outbound queue is full
+DROP_OLDEST = "drop_oldest"   # discard the oldest queued frame
+DROP_NEWEST = "drop_newest"   # discard the frame being queued
+COALESCE = "coalesce"         # replace queued frames with the same key, else drop oldest
+DISCONNECT = "disconnect"     # give up on the client
+
+POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE, DISCONNECT)
+
+# Writer tasks of closed clients until their cancellation has run. The event
+# loop only keeps weak references to tasks.
+closing_tasks: set[asyncio.Task] = set()
+
+
+class ClientQueue:
+    def __init__(self, websocket: WebSocket, maxsize=64, policy=COALESCE, send_timeout=5.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.name = None
+        self.binary = False  # Negotiated binary framing, see app.wire
+        self.pending: deque[tuple[str | None, str | bytes]] = deque()
+        self.ready = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def start(self, on_failure):
+        self.task = asyncio.create_task(self.run(on_failure))
+
+    def put(self, message, key=None):
+        if self.closed:
+            return False
+
+        if key is not None and self.policy == COALESCE:
+            for i, (queued_key, _) in enumerate(self.pending):
+                if queued_key == key:
+                    self.pending[i] = (key, message)
+                    self.coalesced += 1
+                    return True
+
+        if len(self.pending) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return False
+            if self.policy == DISCONNECT:
+                self.close()
+                return False
+            self.pending.popleft()
+
+        self.pending.append((key, message))
+        self.max_depth = max(self.max_depth, len(self.pending))
+        self.ready.set()
+        return True
+
+    async def run(self, on_failure):
+        try:
+            while True:
+                while not self.pending:
+                    self.ready.clear()
+                    await self.ready.wait()
+                _, message = self.pending.popleft()
+                if isinstance(message, bytes):
+                    send = self.websocket.send_bytes(message)
+                    counter = metrics.messages_sent_binary
+                else:
+                    send = self.websocket.send_text(message)
+                    counter = metrics.messages_sent_text
+                await asyncio.wait_for(send, self.send_timeout)
+                self.sent += 1
+                counter.inc()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Error sending to %s: %r", self.name or "websocket", e)
+            self.closed = True
+            self.pending.clear()
+            await on_failure(self.websocket)
+
+    def close(self):
+        self.closed = True
+        self.pending.clear()
+        if self.task and not self.task.done():
+            self.task.cancel()
+            closing_tasks.add(self.task)
+            self.task.add_done_callback(closing_tasks.discard)
+
+    def stats(self):
+        return {
+            "user": self.name,
+            "binary": self.binary,
+            "queue_depth": len(self.pending),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closed": self.closed,
+        }
+
+
+class Broadcaster:
+    def __init__(self, maxsize=64, policy=COALESCE, send_timeout=5.0, on_failure=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_failure = on_failure
+        self.clients: dict[WebSocket, ClientQueue] = {}
+        self.binary_clients = 0
+
+    def add(self, websocket: WebSocket):
+        client = ClientQueue(websocket, self.maxsize, self.policy, self.send_timeout)
+        self.clients[websocket] = client
+        client.start(self._failed)
+        return client
+
+    def remove(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            self.binary_clients -= client.binary
+            client.close()
+
+    def set_binary(self, websocket: WebSocket, binary=True):
+        client = self.clients.get(websocket)
+        if client and client.binary != binary:
+            client.binary = binary
+            self.binary_clients += 1 if binary else -1
+
+    async def _failed(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            self.binary_clients -= client.binary
+        if self.on_failure:
+            await self.on_failure(websocket)
+
+    def send(self, websocket: WebSocket, message, key=None):
+        client = self.clients.get(websocket)
+        return client.put(message, key) if client else False
+
+    def broadcast(self, message, key=None, binary=None):
+        # binary is the same frame for clients that negotiated binary framing
+        closed = []
+        for websocket, client in self.clients.items():
+            client.put(binary if client.binary and binary is not None else message, key)
+            if client.closed:
+                closed.append(websocket)
+        # Clients dropped by the DISCONNECT policy never reach their writer's
+        # failure path, so report them here
+        for websocket in closed:
+            client = self.clients.pop(websocket)
+            self.binary_clients -= client.binary
+            if self.on_failure:
+                asyncio.create_task(self.on_failure(websocket))
+
+    def stats(self):
+        return [client.stats() for client in self.clients.values()]
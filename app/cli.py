@@ -0,0 +1,93 @@
+import argparse
+import copy
+import os
+from app.backend import BACKENDS, SqliteBackend
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app", description="Run the party games server without the GUI")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=6969)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, more than one needs the sqlite backend")
+    parser.add_argument("--backend", choices=BACKENDS, help="Room state backend (default: memory, sqlite with several workers)")
+    parser.add_argument("--state-path", default="party_state.db", help="Event log shared by the workers (sqlite backend)")
+    parser.add_argument("--history-db", default=None, help="Saved rounds database (default: press_history.db)")
+    parser.add_argument("--no-announce", action="store_true", help="Don't advertise the server to guests on the LAN")
+    parser.add_argument("--journal", help="Event log to restore rooms from and append to (default: party_journal.jsonl)")
+    parser.add_argument("--no-journal", action="store_true", help="Don't log room events or restore rooms on start")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--log-file", default=os.environ.get("PARTY_LOG_FILE", ""), help="Also log to this rotating file")
+    args = parser.parse_args(argv)
+
+    if args.backend is None:
+        args.backend = "sqlite" if args.workers > 1 else "memory"
+    if args.workers > 1 and args.backend == "memory":
+        parser.error("--workers above 1 needs a shared backend, use --backend sqlite")
+    if args.log_file and args.workers > 1:
+        parser.error("workers can't share a rotating log file, use --workers 1 or drop --log-file")
+    if args.journal and args.backend != "memory":
+        parser.error("the journal only works with the memory backend")
+    if args.history_db == ":memory:" and args.workers > 1:
+        parser.error("workers can't share an in-memory history database")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Workers are separate processes that import app.server, settings reach
+    # them through the environment
+    os.environ["PARTY_BACKEND"] = args.backend
+    os.environ["PARTY_STATE_PATH"] = args.state_path
+    if args.history_db:
+        os.environ["PARTY_HISTORY_DB"] = args.history_db
+    if args.no_journal:
+        os.environ["PARTY_JOURNAL"] = ""
+    elif args.journal:
+        os.environ["PARTY_JOURNAL"] = args.journal
+
+    if args.backend == "sqlite":
+        # Events from a previous run would be replayed by the new workers
+        SqliteBackend(args.state_path).reset()
+
+    if not args.no_announce:
+        # From the supervising process, so there's one beacon however many workers
+        from app.discovery import Announcer
+        Announcer(args.port).start()
+
+    import uvicorn
+    uvicorn.run(
+        "app.server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        log_config=log_config(args),
+    )
+
+
+def log_config(args):
+    # uvicorn applies this in every worker, so the app's loggers are set up
+    # there the same way as uvicorn's own
+    from app import console
+    from uvicorn.config import LOGGING_CONFIG
+    config = copy.deepcopy(LOGGING_CONFIG)
+    handlers = ["default"]
+    if args.log_file:
+        config["formatters"]["file"] = {"format": console.FORMAT}
+        config["handlers"]["file"] = {
+            "class": "logging.handlers.RotatingFileHandler",
+            "formatter": "file",
+            "filename": args.log_file,
+            "maxBytes": console.LOG_FILE_BYTES,
+            "backupCount": console.LOG_FILE_BACKUPS,
+            "encoding": "utf-8",
+        }
+        handlers.append("file")
+        config["loggers"]["uvicorn"]["handlers"] = handlers
+    config["loggers"]["app"] = {"handlers": handlers, "level": args.log_level.upper(), "propagate": False}
+    return config
+
+
+if __name__ == "__main__":
+    main()
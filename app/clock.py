@@ -0,0 +1,45 @@
+import time
+from collections import deque
+
+# How far before its arrival a client may claim a press happened, anything
+# older is clamped so a skewed or lying clock can't buy a win
+MAX_PRESS_LATENCY_NS = 500_000_000
+# Round trips longer than this can only come from a pong that doesn't answer
+# one of our pings
+MAX_RTT_NS = 60_000_000_000
+
+
+def now_ns():
+    return time.perf_counter_ns()
+
+
+class ClockSync:
+    # Estimates the offset between a client's monotonic clock and ours from
+    # ping/pong samples. The sample with the lowest round trip is the least
+    # affected by queueing, so that's the one used for corrections.
+    def __init__(self, window=16):
+        self.samples: deque[tuple[int, int]] = deque(maxlen=window)
+        self.last_rtt_ns = None  # Current connection quality, not used for corrections
+
+    def add_sample(self, sent_ns, client_ns, received_ns):
+        rtt_ns = received_ns - sent_ns
+        if not 0 <= rtt_ns <= MAX_RTT_NS:
+            return
+        self.last_rtt_ns = rtt_ns
+        offset_ns = client_ns - (sent_ns + rtt_ns // 2)
+        self.samples.append((rtt_ns, offset_ns))
+
+    def best(self):
+        return min(self.samples) if self.samples else None
+
+    @property
+    def rtt_ns(self):
+        best = self.best()
+        return best[0] if best else None
+
+    def to_server_time(self, client_ns, received_ns):
+        best = self.best()
+        if client_ns is None or best is None:
+            return received_ns
+        corrected_ns = client_ns - best[1]
+        return max(min(corrected_ns, received_ns), received_ns - MAX_PRESS_LATENCY_NS)
@@ -0,0 +1,130 @@
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from collections import deque
+
+# Host console settings. The console keeps the last CONSOLE_LINES log lines,
+# PARTY_LOG_FILE additionally writes everything to a rotating file.
+LOG_LEVEL = os.environ.get("PARTY_LOG_LEVEL", "INFO").upper()
+CONSOLE_LINES = int(os.environ.get("PARTY_CONSOLE_LINES", 1000))
+LOG_FILE = os.environ.get("PARTY_LOG_FILE", "")
+LOG_FILE_BYTES = int(os.environ.get("PARTY_LOG_FILE_BYTES", 1_000_000))
+LOG_FILE_BACKUPS = int(os.environ.get("PARTY_LOG_FILE_BACKUPS", 3))
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class ConsoleSink(logging.Handler):
+    # Collects formatted lines into a ring buffer and hands them to a text
+    # view in batches from the Tk loop. emit() only appends to a deque, so
+    # nothing that logs ever waits on the widget.
+    def __init__(self, capacity=CONSOLE_LINES, level=LOG_LEVEL):
+        super().__init__(logging.DEBUG)  # The view filters, the buffer keeps everything
+        self.capacity = capacity
+        self.records: deque[tuple[int, str]] = deque(maxlen=capacity)
+        self.pending: deque[tuple[int, str]] = deque(maxlen=capacity)
+        self.view_level = logging.getLevelName(level)
+        self.master = None
+        self.pump = None
+        self.view = None
+        self.interval = 100
+
+    def emit(self, record):
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        # Called with the handler lock held
+        for line in text.splitlines():
+            self.records.append((record.levelno, line))
+            self.pending.append((record.levelno, line))
+
+    def attach(self, master, pump, view, interval=100):
+        self.master = master
+        self.pump = pump
+        self.view = view
+        self.interval = interval
+        self.redraw()
+        master.after(self.interval, self.flush_view)
+
+    def visible(self, lines):
+        return [line for levelno, line in lines if levelno >= self.view_level]
+
+    def flush_view(self):
+        self.acquire()
+        try:
+            pending = list(self.pending)
+            self.pending.clear()
+        finally:
+            self.release()
+        lines = self.visible(pending)
+        if lines:
+            self.pump.append_lines(self.view, lines)
+            self.pump.trim(self.view, self.capacity)
+        self.master.after(self.interval, self.flush_view)
+
+    def set_view_level(self, level):
+        self.view_level = logging.getLevelName(level)
+        self.redraw()
+
+    def redraw(self):
+        self.acquire()
+        try:
+            lines = self.visible(self.records)
+            self.pending.clear()
+        finally:
+            self.release()
+        self.pump.set_lines(self.view, lines)
+
+
+class StreamToLogger:
+    # File-like stand-in for sys.stdout/sys.stderr, print() output becomes
+    # one log record per line
+    def __init__(self, logger, level):
+        self.logger = logger
+        self.level = level
+        self.buffer = ""
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.buffer += text
+            *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                self.logger.log(self.level, line.rstrip())
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def install(sink=None, level=LOG_LEVEL, log_file=LOG_FILE):
+    # Routes every logger through a queue to a listener thread, so a log call
+    # on the server's loop is a queue put and never a widget update or a disk
+    # write. Returns the QueueListener, stop() it to flush on exit.
+    handlers = []
+    if sink is not None:
+        handlers.append(sink)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+        handlers.append(file_handler)
+    formatter = logging.Formatter(FORMAT, "%H:%M:%S")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import secrets
+import select
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Hosts announce themselves with UDP beacons on this port. Guests listening
+# for them probe each host they hear from and time the echo, so they can
+# offer the closest host first.
+DISCOVERY_PORT = int(os.environ.get("PARTY_DISCOVERY_PORT", 6970))
+# Beacons go to 127.0.0.1 instead of the broadcast address, for trying host
+# and guests on one machine
+LOOPBACK = os.environ.get("PARTY_DISCOVERY_LOOPBACK", "0") != "0"
+
+SERVICE = "party-games-button"
+BEACON_INTERVAL = 1.0
+HOST_TIMEOUT = 3 * BEACON_INTERVAL  # Forget hosts we haven't heard from in this long
+PROBE_INTERVAL = 1.0
+MAX_DATAGRAM = 1024
+
+
+def encode(message):
+    return json.dumps({"service": SERVICE, **message}).encode()
+
+
+def decode(data):
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("service") != SERVICE:
+        return None
+    return message
+
+
+class Announcer:
+    # Runs on the host: broadcasts a beacon every interval and echoes probes
+    # straight back so guests can measure the round trip
+    def __init__(self, port, name=None, discovery_port=DISCOVERY_PORT, loopback=LOOPBACK, interval=BEACON_INTERVAL):
+        self.port = port
+        self.name = name or socket.gethostname()
+        self.discovery_port = discovery_port
+        self.target = "127.0.0.1" if loopback else "<broadcast>"
+        self.interval = interval
+        self.id = secrets.token_hex(4)
+        self.sock = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sock.bind(("", 0))
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        logger.info("Announcing %s on UDP %s (%s)", self.name, self.discovery_port, self.target)
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(1)
+            self.thread = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def run(self):
+        beacon = encode({"type": "beacon", "id": self.id, "name": self.name, "port": self.port})
+        next_beacon = 0.0
+        while self.running:
+            now = time.monotonic()
+            if now >= next_beacon:
+                try:
+                    self.sock.sendto(beacon, (self.target, self.discovery_port))
+                except OSError as e:
+                    logger.warning("Discovery beacon failed: %r", e)
+                next_beacon = now + self.interval
+            # Short waits so stop() doesn't hold up the caller
+            readable, _, _ = select.select([self.sock], [], [], min(0.2, max(0.0, next_beacon - time.monotonic())))
+            if not readable:
+                continue
+            try:
+                data, address = self.sock.recvfrom(MAX_DATAGRAM)
+            except OSError:
+                continue
+            message = decode(data)
+            if message and message.get("type") == "probe":
+                self.sock.sendto(encode({"type": "echo", "id": self.id, "sent_ns": message.get("sent_ns")}), address)
+
+
+class Browser:
+    # Runs on a guest: collects beacons into a host list, keeps an RTT per host
+    # and calls on_change with the list, closest first, whenever it changes.
+    # on_change is called from the browser thread.
+    def __init__(self, on_change, discovery_port=DISCOVERY_PORT):
+        self.on_change = on_change
+        self.discovery_port = discovery_port
+        self.hosts: dict[str, dict] = {}
+        self.sock = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            # More than one guest on the same machine
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            self.sock.bind(("", self.discovery_port))
+        except OSError as e:
+            logger.warning("Discovery unavailable, can't listen on UDP %s: %r", self.discovery_port, e)
+            self.sock.close()
+            self.sock = None
+            return
+        self.hosts = {}
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(1)
+            self.thread = None
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def run(self):
+        while self.running:
+            readable, _, _ = select.select([self.sock], [], [], 0.2)
+            changed = self.expire()
+            if readable:
+                try:
+                    data, address = self.sock.recvfrom(MAX_DATAGRAM)
+                except OSError:
+                    continue
+                message = decode(data)
+                if message and message.get("type") == "beacon":
+                    changed = self.on_beacon(message, address) or changed
+                elif message and message.get("type") == "echo":
+                    changed = self.on_echo(message) or changed
+            if changed:
+                self.on_change(self.sorted_hosts())
+
+    def on_beacon(self, message, address):
+        # Anything can arrive on the port, beacons that don't look like ours are dropped
+        name, port = message.get("name", address[0]), message.get("port")
+        if (not isinstance(message.get("id"), str) or not isinstance(name, str)
+                or type(port) is not int or not 0 < port < 65536):
+            logger.debug("Ignoring malformed beacon from %s", address[0])
+            return False
+        host = self.hosts.get(message["id"])
+        new = host is None
+        now = time.monotonic()
+        if new:
+            host = self.hosts[message["id"]] = {"id": message["id"], "rtt_ms": None, "probed": 0.0}
+        host.update(name=name, ip=address[0], port=port, address=address, seen=now)
+        if now - host["probed"] >= PROBE_INTERVAL:
+            host["probed"] = now
+            try:
+                self.sock.sendto(encode({"type": "probe", "sent_ns": time.monotonic_ns()}), address)
+            except OSError:
+                pass
+        return new
+
+    def on_echo(self, message):
+        host_id = message.get("id")
+        host = self.hosts.get(host_id) if isinstance(host_id, str) else None
+        if host is None or type(message.get("sent_ns")) is not int:
+            return False
+        rtt_ms = (time.monotonic_ns() - message["sent_ns"]) / 1e6
+        # Smoothed, one slow echo shouldn't reorder the list
+        host["rtt_ms"] = rtt_ms if host["rtt_ms"] is None else 0.7 * host["rtt_ms"] + 0.3 * rtt_ms
+        return True
+
+    def expire(self):
+        cutoff = time.monotonic() - HOST_TIMEOUT
+        gone = [host_id for host_id, host in self.hosts.items() if host["seen"] < cutoff]
+        for host_id in gone:
+            del self.hosts[host_id]
+        return bool(gone)
+
+    def sorted_hosts(self):
+        # Unmeasured hosts last
+        return sorted(
+            ({key: host[key] for key in ("id", "name", "ip", "port", "rtt_ms")} for host in self.hosts.values()),
+            key=lambda host: (host["rtt_ms"] is None, host["rtt_ms"] or 0.0, host["name"]),
+        )
+
+
+def format_host(host):
+    text = f"{host['name']}  {host['ip']}:{host['port']}"
+    if host["rtt_ms"] is not None:
+        text += f"  {host['rtt_ms']:.1f} ms"
+    return text
@@ -0,0 +1,73 @@
+import json
+import logging
+import struct
+import time
+from app import metrics
+from app import wire
+
+logger = logging.getLogger(__name__)
+
+
+class FrameCache:
+    # Encoded frames of a room's state, built once per state version and
+    # handed to every socket that needs one, so a snapshot going out to a
+    # hundred clients (or a join storm) costs one json.dumps rather than a
+    # hundred. Each frame is stored with the version it was built from, the
+    # caller passes the current version and a frame for an older one is
+    # rebuilt. Versions only move on real changes, nothing is thrown away
+    # when the state is merely touched.
+    def __init__(self):
+        self.frames: dict = {}
+
+    def get(self, key, version, build):
+        cached = self.frames.get(key)
+        if cached is not None and cached[0] == version:
+            metrics.frame_cache_hits.inc()
+            return cached[1]
+        metrics.frame_cache_misses.inc()
+        frame = build()
+        self.frames[key] = (version, frame)
+        return frame
+
+    def clear(self):
+        # For changes that don't move a version, like a restore
+        self.frames.clear()
+
+    def size(self):
+        return sum(len(frame) for version, frame in self.frames.values())
+
+
+class EventFrames:
+    # A broadcast event and its encodings, the JSON one made up front and the
+    # binary one on first use. Kept in the replay buffer so a resuming client
+    # gets the very frames everyone else got.
+    __slots__ = ("event", "message", "binary")
+
+    def __init__(self, event, message=None, binary=None):
+        self.event = event
+        self.message = message
+        self.binary = binary
+
+    def json(self):
+        if self.message is None:
+            start = time.perf_counter()
+            self.message = json.dumps(self.event)
+            metrics.json_encode_seconds.observe(time.perf_counter() - start)
+        return self.message
+
+    def encoded(self, user_ids):
+        # Binary frame, or None if the event only exists as JSON
+        if self.binary is None:
+            # b"" marks an event that was tried and has no binary form
+            try:
+                self.binary = wire.encode_event(self.event, user_ids) or b""
+            except (KeyError, struct.error) as e:
+                # Goes out as JSON, binary clients read that too
+                logger.warning("No binary frame for %s event %s: %r", self.event["type"], self.event.get("seq"), e)
+                self.binary = b""
+        return self.binary or None
+
+    def frame_for(self, binary, user_ids):
+        if binary:
+            return self.encoded(user_ids) or self.json()
+        return self.json()
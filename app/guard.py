@@ -0,0 +1,150 @@
+import json
+import os
+import struct
+import time
+from collections import Counter
+from app import metrics
+from app import protocol
+from app import wire
+
+# Limits on what a single connection may send. Every message, pongs included,
+# takes a token from a bucket refilled at PARTY_RATE_LIMIT per second up to
+# PARTY_RATE_BURST, 0 turns the limit off. Messages over the limit are
+# dropped, a connection with PARTY_MAX_REJECTS rejections in a row is closed.
+RATE_LIMIT = float(os.environ.get("PARTY_RATE_LIMIT", 20))
+RATE_BURST = float(os.environ.get("PARTY_RATE_BURST", 40))
+MAX_REJECTS = int(os.environ.get("PARTY_MAX_REJECTS", 100))
+# Characters for JSON messages, bytes for binary frames
+MAX_MESSAGE_SIZE = int(os.environ.get("PARTY_MAX_MESSAGE_SIZE", 4096))
+MAX_NAME_LENGTH = int(os.environ.get("PARTY_MAX_NAME_LENGTH", 32))
+# Integer fields end up in 64-bit binary frames, anything wider is refused
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+# Payload fields of each client action as name -> (type, required). Optional
+# fields may also be null. Checked by hand, it's a handful of isinstance
+# calls per message rather than a schema library on the hot path.
+SCHEMAS = {
+    "on_connect": {"name": (str, True), "binary": (bool, False), "resume": (str, False), "last_seq": (int, False)},
+    "snapshot_request": {},
+    "pong": {"server_ns": (int, True), "client_ns": (int, True)},
+    "button_press": {"client_ns": (int, False)},
+}
+
+# Actions that need the connection to have registered first
+REGISTERED_ACTIONS = {"snapshot_request", "button_press"}
+
+# All a read-only connection may send, see the spectator endpoint
+SPECTATOR_ACTIONS = {"pong"}
+
+# Rejected messages on this worker, by reason
+rejected: Counter[str] = Counter()
+
+
+class Rejected(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Guard:
+    # Checks everything one connection sends before it's dispatched. The
+    # connection's identity is the name it registered with in on_connect,
+    # whatever "user" later messages claim to be.
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, max_rejects=MAX_REJECTS, actions=None):
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.actions = actions  # None for all of SCHEMAS
+        self.max_rejects = max_rejects
+        self.name = None
+        self.rejected = 0
+        self.strikes = 0  # Rejections since the last accepted message
+
+    def bind(self, name):
+        self.name = name
+
+    def reject(self, reason):
+        rejected[reason] += 1
+        self.rejected += 1
+        self.strikes += 1
+        raise Rejected(reason)
+
+    def exhausted(self):
+        return self.max_rejects > 0 and self.strikes >= self.max_rejects
+
+    def admit_text(self, text):
+        # Returns (action, payload) of a valid JSON message, raises Rejected
+        self.limit(len(text))
+        start = time.perf_counter()
+        try:
+            data = json.loads(text)
+        except (ValueError, RecursionError):
+            # Deeply nested arrays fit in a small message but not on the stack
+            self.reject("bad_json")
+        metrics.json_decode_seconds.observe(time.perf_counter() - start)
+        if not isinstance(data, dict):
+            self.reject("bad_schema")
+        action = data.get("action")
+        fields = SCHEMAS.get(action) if isinstance(action, str) else None
+        if fields is None:
+            self.reject("unknown_action")
+        payload = data.get("payload")
+        if payload is None:
+            payload = {}
+        elif not isinstance(payload, dict):
+            self.reject("bad_schema")
+        for field, (kind, required) in fields.items():
+            value = payload.get(field)
+            if value is None:
+                if required:
+                    self.reject("bad_schema")
+            # bool is an int subclass, a flag isn't a timestamp
+            elif type(value) is not kind:
+                self.reject("bad_schema")
+            elif kind is int and not INT_MIN <= value <= INT_MAX:
+                self.reject("bad_schema")
+        if action == "on_connect" and (not 0 < len(payload["name"].strip()) <= MAX_NAME_LENGTH
+                                       or payload["name"] in protocol.RESERVED_NAMES):
+            self.reject("bad_name")
+        return self.identify(action), payload
+
+    def admit_binary(self, frame):
+        self.limit(len(frame))
+        try:
+            action, payload = wire.decode_client(frame)
+        except (ValueError, IndexError, struct.error):
+            self.reject("bad_frame")
+        return self.identify(action), payload
+
+    def limit(self, size):
+        if self.bucket is not None and not self.bucket.take():
+            self.reject("rate_limited")
+        if size > MAX_MESSAGE_SIZE:
+            self.reject("too_large")
+
+    def identify(self, action):
+        # A read-only connection never registers, so this goes first
+        if self.actions is not None and action not in self.actions:
+            self.reject("read_only")
+        if action == "on_connect" and self.name is not None:
+            self.reject("already_registered")
+        if action in REGISTERED_ACTIONS and self.name is None:
+            self.reject("not_registered")
+        self.strikes = 0
+        return action
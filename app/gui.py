@@ -0,0 +1,935 @@
+import sys
+import json
+import time
+import random
+import logging
+import threading
+import tkinter as tk
+from app import console
+from app import protocol
+from app import wire
+import customtkinter as ctk
+from app.analytics import format_player
+from app.discovery import Announcer, Browser, format_host
+from app.input import PRESS_KEYS, KeyBindings, PressSender
+from app.ui_pump import LineView, UIPump, VirtualView
+
+# The server stack (fastapi, uvicorn and app.server with its stores), the
+# websocket client and the keyboard hook are imported where they're first
+# needed, so a guest never loads the server and the window shows up sooner.
+
+def virtual_list(master):
+    # Textbox for long lists, it only ever holds the rows in view and
+    # scrolls with its own scrollbar. Returns the frame to place and the view.
+    frame = ctk.CTkFrame(master, fg_color="transparent")
+    frame.grid_rowconfigure(0, weight=1)
+    frame.grid_columnconfigure(0, weight=1)
+    textbox = ctk.CTkTextbox(frame, activate_scrollbars=False, wrap="none")
+    textbox.grid(row=0, column=0, sticky="nsew")
+    textbox.configure(state="disabled")
+    scrollbar = ctk.CTkScrollbar(frame)
+    scrollbar.grid(row=0, column=1, sticky="ns")
+    view = VirtualView(textbox, scrollbar)
+    scrollbar.configure(command=view.yview)
+    return frame, view
+
+class App(ctk.CTk):
+
+    def __init__(self):
+        super().__init__()
+
+        self.base_title = "Party Games App"
+        self.title(self.base_title)
+        self.geometry("800x600")
+        self.minsize(800, 600)  # Minimum window size set
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # Every widget update from a worker thread goes through the pump
+        self.pump = UIPump(self)
+        self.pump.start()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Screens are built the first time they're shown
+        self.frames = {}
+
+        self.current_frame = None
+        self.show_frame(MainScreen)
+
+    def on_close(self):
+        # No more drains once the widgets are gone
+        self.pump.stop()
+        self.destroy()
+
+    def get_frame(self, cont):
+        frame = self.frames.get(cont)
+        if frame is None:
+            frame = self.frames[cont] = cont(self)
+            frame.grid(row=0, column=0, sticky="nsew")
+        return frame
+
+    def show_frame(self, cont):
+        current_frame = self.current_frame
+
+        # Stop server if leaving HostScreen but not for HistoryScreen
+        if isinstance(current_frame, HostScreen) and cont != HistoryScreen:
+            current_frame.stop_server()
+
+        if isinstance(current_frame, HostScreen) and not isinstance(cont, HostScreen):
+            current_frame.stop_server_connection()
+
+        if isinstance(current_frame, ConnectScreen) and cont != ConnectScreen:
+            current_frame.stop_discovery()
+
+        frame = self.get_frame(cont)
+        frame.tkraise()
+        self.current_frame = frame
+
+        # Start server if entering HostScreen but not from HistoryScreen
+        if isinstance(frame, HostScreen) and not isinstance(current_frame, HistoryScreen):
+            print(f"\nApp:\tEntered HostScreen")
+            frame.start_server()
+
+        if isinstance(frame, ConnectScreen):
+            frame.start_discovery()
+
+        # Update history screen if we're showing it
+        if isinstance(frame, HistoryScreen):
+            frame.update_history()
+
+        if isinstance(frame, LeaderboardScreen):
+            frame.update_leaderboard()
+
+        if isinstance(frame, HostScreen):
+            frame.start_server_connection()
+
+        # Update window title
+        if isinstance(frame, (MainScreen, ConnectScreen)):
+            self.title(self.base_title)
+        elif isinstance(frame, (HostScreen, HistoryScreen, LeaderboardScreen)):
+            self.title(f"{self.base_title} - Hosting Game")
+        elif isinstance(frame, GuestScreen):
+            frame.update_title(disconnected=True)
+
+
+class MainScreen(ctk.CTkFrame):
+    def __init__(self, master):
+        super().__init__(master)
+
+        self.master = master
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        content_frame = ctk.CTkFrame(self, fg_color="transparent")
+        content_frame.grid(row=1, column=0, sticky="nsew")
+        content_frame.grid_rowconfigure((0, 1, 2), weight=1)
+        content_frame.grid_columnconfigure(0, weight=1)
+
+        # Fonts (initial size, will update dynamically)
+        self.label_font = ctk.CTkFont(size=16)
+        self.button_font = ctk.CTkFont(size=14)
+
+        # Label
+        self.label = ctk.CTkLabel(content_frame, text="Choose Your Role", font=self.label_font)
+        self.label.grid(row=0, column=0, pady=(0, 10), sticky="s")
+
+        # Buttons
+        self.host_button = ctk.CTkButton(content_frame, text="Host", command=lambda: master.show_frame(HostScreen), height=36, font=self.button_font)
+        self.host_button.grid(row=2, column=0, padx=50, pady=(5, 0), sticky="nsew")
+
+        self.guest_button = ctk.CTkButton(content_frame, text="Guest", command=lambda: master.show_frame(ConnectScreen), height=36, font=self.button_font)
+        self.guest_button.grid(row=1, column=0, padx=50, pady=(0, 5), sticky="nsew")
+
+        # Bind resize event
+        self.bind("<Configure>", self.on_resize)
+
+    def on_resize(self, event):
+        width = event.width
+        height = event.height
+
+        # Adjust font sizes based on window size
+        new_label_size = max(12, int(height / 25))
+        new_button_size = max(10, int(height / 30))
+
+        self.label_font.configure(size=new_label_size)
+        self.button_font.configure(size=new_button_size)
+
+
+class ConnectScreen(ctk.CTkFrame):
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        # Hosts found on the LAN, closest first
+        self.hosts = []
+        self.browser = Browser(self.on_hosts_changed)
+
+        # Grid Layout: Keep centered, but control height better
+        self.grid_rowconfigure((0, 6), weight=1)  # Top & Bottom stretch
+        self.grid_rowconfigure((1, 2, 3, 4, 5), weight=0)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.label_font = ctk.CTkFont(size=16)
+        self.button_font = ctk.CTkFont(size=14)
+        self.entry_font = ctk.CTkFont(size=14)
+
+        # Label
+        self.label = ctk.CTkLabel(self, text="Connect", font=self.label_font)
+        self.label.grid(row=1, column=0, pady=(0, 5), sticky="s")
+
+        # IP Entry
+        self.ip_entry = ctk.CTkEntry(self, placeholder_text="Enter IP or Domain (optionally IP/Room), or pick a host below", height=36, font=self.entry_font)
+        self.ip_entry.grid(row=2, column=0, padx=50, pady=(0, 2), sticky="ew")  # 2px between entries
+
+        # Name Entry
+        self.name_entry = ctk.CTkEntry(self, placeholder_text="Enter Your Name (No Spaces)", height=36, font=self.entry_font)
+        self.name_entry.grid(row=3, column=0, padx=50, pady=(0, 5), sticky="ew")
+        self.name_entry.bind("<KeyRelease>", self.validate_name)
+
+        # Button Frame to Equalize Size
+        button_frame = ctk.CTkFrame(self, fg_color="transparent")
+        button_frame.grid(row=4, column=0, padx=50, pady=(5, 0), sticky="ew")
+        button_frame.grid_columnconfigure((0, 1, 2), weight=1)
+
+        self.confirm_button = ctk.CTkButton(button_frame, text="Confirm", command=self.confirm, font=self.button_font, height=40)
+        self.confirm_button.grid(row=0, column=0, padx=(0, 5), sticky="ew")
+
+        # Follows the game without joining it, no name needed
+        self.watch_button = ctk.CTkButton(button_frame, text="Watch", command=self.watch, font=self.button_font, height=40)
+        self.watch_button.grid(row=0, column=1, padx=5, sticky="ew")
+
+        self.back_button = ctk.CTkButton(button_frame, text="Back", command=lambda: master.show_frame(MainScreen), font=self.button_font, height=40)
+        self.back_button.grid(row=0, column=2, padx=(5, 0), sticky="ew")
+
+        # Discovered hosts, clicking one fills in the address
+        self.hosts_frame = ctk.CTkScrollableFrame(self, label_text="Hosts on this network", height=120)
+        self.hosts_frame.grid(row=5, column=0, padx=50, pady=(10, 0), sticky="ew")
+        self.hosts_frame.grid_columnconfigure(0, weight=1)
+        self.host_buttons = []
+
+        self.bind("<Configure>", self.on_resize)
+
+    def start_discovery(self):
+        self.browser.start()
+
+    def stop_discovery(self):
+        self.browser.stop()
+
+    def on_hosts_changed(self, hosts):
+        # Called on the browser thread
+        self.master.pump.call(lambda: self.show_hosts(hosts))
+
+    def show_hosts(self, hosts):
+        self.hosts = hosts
+        while len(self.host_buttons) < len(hosts):
+            button = ctk.CTkButton(self.hosts_frame, font=self.button_font, anchor="w")
+            button.grid(row=len(self.host_buttons), column=0, pady=2, sticky="ew")
+            self.host_buttons.append(button)
+        while len(self.host_buttons) > len(hosts):
+            self.host_buttons.pop().destroy()
+        for button, host in zip(self.host_buttons, hosts):
+            button.configure(text=format_host(host), command=lambda host=host: self.pick_host(host))
+
+    def host_address(self, host):
+        # Keeps a room typed after the address
+        _, _, room = self.ip_entry.get().partition("/")
+        address = f"{host['ip']}:{host['port']}"
+        return f"{address}/{room}" if room else address
+
+    def pick_host(self, host):
+        self.ip_entry.delete(0, tk.END)
+        self.ip_entry.insert(0, self.host_address(host))
+
+    def validate_name(self, event=None):
+        current_text = self.name_entry.get()
+        if " " in current_text:
+            self.name_entry.delete(0, tk.END)
+            self.name_entry.insert(0, current_text.replace(" ", ""))
+
+    def address(self):
+        ip = self.ip_entry.get()
+        if (not ip or ip.startswith("/")) and self.hosts:
+            # No address typed, take the closest host found
+            ip = self.host_address(self.hosts[0])
+        return ip
+
+    def reserved(self, ip, name=None):
+        # Would connect to the spectator routes instead of joining
+        _, _, room = ip.partition("/")
+        if room in protocol.RESERVED_NAMES or name in protocol.RESERVED_NAMES:
+            print(f"\"{protocol.SPECTATE}\" can't be used as a name or room.")
+            return True
+        return False
+
+    def confirm(self):
+        ip = self.address()
+        name = self.name_entry.get()
+        if ip and name and self.reserved(ip, name):
+            return
+        if ip and name:
+            print(f"Connecting to {ip} as {name}")
+            guest_screen = self.master.get_frame(GuestScreen)
+            guest_screen.connect_to_server(ip, name)
+            self.master.after(0, lambda: self.master.show_frame(GuestScreen))  # Delay to ensure screen updates
+        else:
+            print("IP and Name required.")
+
+    def watch(self):
+        ip = self.address()
+        if ip and self.reserved(ip):
+            return
+        if ip:
+            print(f"Watching {ip}")
+            guest_screen = self.master.get_frame(GuestScreen)
+            guest_screen.connect_to_server(ip, None)
+            self.master.after(0, lambda: self.master.show_frame(GuestScreen))
+        else:
+            print("IP required.")
+
+
+    def on_resize(self, event):
+        height = event.height
+        new_label_size = max(12, int(height / 25))
+        new_button_size = max(10, int(height / 30))
+        new_entry_size = max(12, int(height / 28))
+
+        self.label_font.configure(size=new_label_size)
+        self.button_font.configure(size=new_button_size)
+        self.entry_font.configure(size=new_entry_size)
+
+
+class GuestScreen(ctk.CTkFrame):
+    # Dropped connections are retried with exponential backoff, seconds
+    RECONNECT_MIN_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 10.0
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+        self.ws = None
+        self.ws_thread = None
+        self.name = ""
+        self.ip = ""
+        # Key events only stamp and queue a press, the sender thread writes it
+        self.sender = PressSender()
+        self.key_bindings = KeyBindings(master, PRESS_KEYS, self.sender.press)
+        self.feed = protocol.PressFeed()
+        self.binary = False  # Set once the server agrees to binary framing
+        self.user_names: dict[int, str] = {}
+        self.user_list = protocol.UserList()
+        # Resume token from the server's welcome, sent back when reconnecting
+        self.resume_token = None
+        # Bumped on every connect and disconnect so a stale reconnect loop stops
+        self.session = 0
+
+        # Remove top row stretch
+        self.grid_rowconfigure(0, weight=0)
+        self.grid_rowconfigure((1, 2, 3, 4), weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.label_font = ctk.CTkFont(size=16)
+        self.button_font = ctk.CTkFont(size=14)
+
+        self.label = ctk.CTkLabel(self, text="Game", font=self.label_font)
+        self.label.grid(row=0, column=0, pady=10, sticky="s")
+
+        self.textbox = ctk.CTkTextbox(self)
+        self.textbox.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        self.textbox.configure(state="disabled")
+
+        # Connected users, only the visible part of the list is drawn
+        users_frame, self.users_view = virtual_list(self)
+        users_frame.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
+
+        self.text_view = LineView(self.textbox, autoscroll=True)
+
+        self.press_button = ctk.CTkButton(self, text="Press", command=self.sender.press, font=self.button_font)
+        self.press_button.grid(row=3, column=0, padx=50, pady=5, sticky="nsew")
+
+        self.back_button = ctk.CTkButton(self, text="Back", command=self.disconnect, font=self.button_font)
+        self.back_button.grid(row=4, column=0, padx=50, pady=5, sticky="nsew")
+
+        self.bind("<Configure>", self.on_resize)
+
+    def connect_to_server(self, ip, name):
+        # No name watches the game as a spectator: updates only, no presses
+        # and not in anyone's user list
+        self.name = name
+        self.ip = ip
+        # "host/room" joins a specific room, a bare host joins the default one.
+        # Discovered hosts come with their port, typed ones default to 6969.
+        host, _, room = ip.partition("/")
+        if ":" not in host:
+            host += ":6969"
+        if name is None:
+            ws_url = f"ws://{host}/{protocol.SPECTATE}/{room}" if room else f"ws://{host}/{protocol.SPECTATE}"
+        else:
+            ws_url = f"ws://{host}/{room}/{name}" if room else f"ws://{host}/{name}"
+        self.feed = protocol.PressFeed()
+        self.binary = False
+        self.user_names = {}
+        self.user_list = protocol.UserList()
+        self.resume_token = None
+        self.session += 1
+        print(f"App:\tConnecting to {ws_url}")
+        self.update_title(disconnected=True)
+        self.ws_thread = threading.Thread(target=self.run_ws, args=(ws_url, self.session), daemon=True)
+        self.ws_thread.start()
+        if name is None:
+            self.press_button.grid_remove()
+        else:
+            self.press_button.grid()
+            self.key_bindings.start()
+
+    def update_title(self, disconnected=False, reconnect_in=None):
+        if reconnect_in is not None:
+            self.master.title(f"{self.master.base_title} - Reconnecting in {reconnect_in:.0f}s")
+        elif disconnected:
+            self.master.title(f"{self.master.base_title} - Disconnected")
+        elif self.name is None:
+            self.master.title(f"{self.master.base_title} - Watching ({self.ip})")
+        else:
+            self.master.title(f"{self.master.base_title} - In Game as {self.name} ({self.ip})")
+
+    def run_ws(self, ws_url, session):
+        import websocket
+        opened = False
+
+        def on_message(ws, message):
+            try:
+                if isinstance(message, bytes):
+                    data = wire.decode_event(message, self.user_names)
+                    if data is None:
+                        # Press from a user whose ID we haven't seen
+                        self.sender.send(protocol.snapshot_request_message(self.name))
+                        return
+                else:
+                    data = json.loads(message)
+                if data.get("type") in (protocol.SNAPSHOT, protocol.PRESS_APPENDED, protocol.ROUND_RESET):
+                    self.apply_press_update(data)
+                elif data.get("type") == protocol.PING:
+                    if self.binary:
+                        self.sender.send(wire.encode_pong(data["server_ns"], time.monotonic_ns()))
+                    else:
+                        self.sender.send(protocol.pong_message(self.name, data["server_ns"]))
+                elif data.get("type") == wire.WELCOME:
+                    self.binary = self.sender.binary = data.get("binary", False)
+                    self.resume_token = data.get("resume")
+                    if data.get("resumed"):
+                        self.append_text("Reconnected")
+                elif data.get("type") == wire.USER_IDS:
+                    self.user_names.update({user_id: name for name, user_id in data["ids"].items()})
+                elif data.get("type") in (protocol.USERS, protocol.USERS_DELTA):
+                    change = self.user_list.apply(data)
+                    if change is None:
+                        self.sender.send(protocol.snapshot_request_message(self.name))
+                    elif change:
+                        self.update_users_textbox(self.user_list.users)
+                else:
+                    self.append_text(f"Unknown message: {data}")
+            except Exception as e:
+                self.append_text(f"Error parsing message: {message} ({e})")
+
+        def on_error(ws, error):
+            self.master.pump.call(lambda: self.update_title(disconnected=True))
+            self.append_text(f"Connection error: {error}")
+
+        def on_close(ws, close_status_code, close_msg):
+            self.sender.stop()
+            print(f"App:\tKey down to socket write: {self.sender.stats}")
+            self.master.pump.call(lambda: self.update_title(disconnected=True))
+            self.append_text("Connection closed")
+
+        def on_open(ws):
+            nonlocal opened
+            opened = True
+            self.master.pump.call(lambda: self.update_title(disconnected=False))
+            self.append_text("Connection opened")
+            self.sender.start(ws, self.name)
+            if self.name is None:
+                # Spectators only answer pings, the server sends the state unasked
+                return
+            payload = {"name": self.name, "binary": True}
+            if self.resume_token:
+                # Lets the server hand back our place and only the events we missed
+                payload.update(resume=self.resume_token, last_seq=self.feed.seq)
+            connect_msg = {
+                "user": self.name,
+                "action": "on_connect",
+                "payload": payload
+            }
+            self.sender.send(json.dumps(connect_msg))
+
+        delay = self.RECONNECT_MIN_DELAY
+        while session == self.session:
+            opened = False
+            self.ws = websocket.WebSocketApp(
+                ws_url,
+                on_message=on_message,
+                on_error=on_error,
+                on_close=on_close,
+                on_open=on_open
+            )
+            self.ws.run_forever()
+            if session != self.session:
+                break
+            # Start over from the shortest delay once a connection worked
+            delay = self.RECONNECT_MIN_DELAY if opened else min(delay * 2, self.RECONNECT_MAX_DELAY)
+            wait = delay * random.uniform(0.8, 1.2)
+            print(f"App:\tReconnecting in {wait:.1f}s")
+            self.master.pump.call(lambda: self.update_title(reconnect_in=wait))
+            time.sleep(wait)
+
+    def apply_press_update(self, data):
+        change = self.feed.apply(data)
+        if change is None:
+            self.sender.send(protocol.snapshot_request_message(self.name))
+        elif change == protocol.SNAPSHOT:
+            self.update_textbox(self.feed.lines())
+        elif change == protocol.PRESS_APPENDED:
+            # Later presses just add a line, an earlier one shifts everyone's offset
+            if self.feed.last_index == len(self.feed.presses) - 1:
+                self.append_text(protocol.format_press(data["press"], self.feed.presses[0]["corrected_ns"]))
+            else:
+                self.update_textbox(self.feed.lines())
+        elif change == protocol.ROUND_RESET:
+            self.update_textbox([])
+
+    def update_textbox(self, latest_presses):
+        self.master.pump.set_lines(self.text_view, latest_presses)
+
+    def append_text(self, text):
+        self.master.pump.append_line(self.text_view, text)
+
+    def disconnect(self):
+        self.session += 1  # Stops the reconnect loop
+        self.key_bindings.stop()
+        if self.ws:
+            self.ws.close()
+        self.sender.stop()
+        self.master.show_frame(MainScreen)
+
+    def on_resize(self, event):
+        height = event.height
+        new_label_size = max(12, int(height / 25))
+        new_button_size = max(10, int(height / 30))
+        self.label_font.configure(size=new_label_size)
+        self.button_font.configure(size=new_button_size)
+    
+    def update_users_textbox(self, users):
+        self.master.pump.set_lines(self.users_view, users)
+
+
+class HostScreen(ctk.CTkFrame):
+    ACCEPT_LIMITS = {"Accept All": 0, "First 1": 1, "First 3": 3, "First 5": 5}
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+        self.server_thread = None
+        self.server = None
+        self.server_running = False
+        self.announcer = Announcer(6969)
+        self.subscribed = False
+        self.feed = protocol.PressFeed()
+        # Connected users and their connection quality, by name
+        self.user_list = protocol.UserList()
+        self.presence: dict[str, dict] = {}
+        # Previous metrics reading and when it was taken, rates are per interval
+        self.last_metrics = None
+        self.polling_metrics = False
+
+        # Fonts
+        self.label_font = ctk.CTkFont(size=16)
+        self.button_font = ctk.CTkFont(size=14)
+
+        # UI Layout
+        self.grid_rowconfigure((0, 1, 2, 4, 5), weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.label = ctk.CTkLabel(self, text="Host Screen", font=self.label_font)
+        self.label.grid(row=0, column=0, pady=10, sticky="s")
+
+        # Split Row 1 into 2 columns with matching background
+        split_frame = ctk.CTkFrame(self, fg_color="transparent")  # Transparent background
+        split_frame.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        split_frame.grid_columnconfigure((0, 1), weight=1)
+        split_frame.grid_rowconfigure(0, weight=1)
+
+        # Left: Latest Presses Textbox
+        self.textbox = ctk.CTkTextbox(split_frame)
+        self.textbox.grid(row=0, column=0, padx=5, sticky="nsew")
+        self.textbox.configure(state="disabled")
+
+        # Right: Connected users, only the visible part of the list is drawn
+        users_frame, self.users_view = virtual_list(split_frame)
+        users_frame.grid(row=0, column=1, padx=5, sticky="nsew")
+
+        self.console = ctk.CTkTextbox(self)
+        self.console.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
+        self.console.configure(state="disabled")
+
+        # Live server numbers, refreshed every second while hosting
+        self.metrics_label = ctk.CTkLabel(self, text="", anchor="w")
+        self.metrics_label.grid(row=3, column=0, padx=10, sticky="ew")
+
+        self.press_view = LineView(self.textbox)
+        self.console_view = LineView(self.console, autoscroll=True)
+
+        # Everything logged, prints included, lands in the console in batches
+        self.console_sink = console.ConsoleSink()
+        self.log_listener = console.install(self.console_sink)
+        self.console_sink.attach(master, master.pump, self.console_view)
+        sys.stdout = console.StreamToLogger(logging.getLogger("app.stdout"), logging.INFO)
+        sys.stderr = console.StreamToLogger(logging.getLogger("app.stderr"), logging.ERROR)
+
+        # Buttons
+        round_frame = ctk.CTkFrame(self, fg_color="transparent")
+        round_frame.grid(row=4, column=0, padx=50, pady=5, sticky="nsew")
+        round_frame.grid_columnconfigure(0, weight=3)
+        round_frame.grid_columnconfigure((1, 2), weight=1)
+        round_frame.grid_rowconfigure(0, weight=1)
+
+        self.save_button = ctk.CTkButton(round_frame, text="Save to History", command=self.save_to_history, font=self.button_font)
+        self.save_button.grid(row=0, column=0, padx=(0, 5), sticky="nsew")
+
+        # How many presses a round accepts before it locks
+        self.accept_limit_menu = ctk.CTkOptionMenu(round_frame, values=list(self.ACCEPT_LIMITS), command=self.set_accept_limit, font=self.button_font)
+        self.accept_limit_menu.grid(row=0, column=1, padx=5, sticky="nsew")
+
+        # Lowest level shown in the console, the buffer keeps the rest
+        self.log_level_menu = ctk.CTkOptionMenu(round_frame, values=console.LEVELS, command=self.console_sink.set_view_level, font=self.button_font)
+        self.log_level_menu.set(console.LOG_LEVEL)
+        self.log_level_menu.grid(row=0, column=2, padx=(5, 0), sticky="nsew")
+
+        self.history_button = ctk.CTkButton(self, text="View History", command=lambda: master.show_frame(HistoryScreen), font=self.button_font)
+        self.history_button.grid(row=5, column=0, padx=50, pady=5, sticky="nsew")
+
+        self.back_button = ctk.CTkButton(self, text="Back", command=lambda: master.show_frame(MainScreen), font=self.button_font)
+        self.back_button.grid(row=6, column=0, padx=50, pady=5, sticky="nsew")
+
+        self.bind("<Configure>", self.on_resize)
+
+    def start_server_connection(self):
+        # Subscribe to the room in-process once the server loop is up
+        if self.subscribed:
+            return
+        self.subscribed = True
+        self.feed = protocol.PressFeed()
+        self.user_list = protocol.UserList()
+
+        from app import server
+
+        def subscribe():
+            if not server.server_ready.wait(10):
+                print("App:\tServer did not start, not subscribing")
+                self.subscribed = False
+                return
+            try:
+                server.subscribe(self.on_room_event).result(5)
+                print("App:\tHost subscribed to server state")
+            except Exception as e:
+                print(f"App:\tError subscribing to server: {e}")
+                self.subscribed = False
+
+        threading.Thread(target=subscribe, daemon=True).start()
+        if not self.polling_metrics:
+            self.polling_metrics = True
+            self.last_metrics = None
+            self.after(1000, self.poll_metrics)
+
+    def poll_metrics(self):
+        if not self.subscribed:
+            self.polling_metrics = False
+            return
+        from app import server
+        try:
+            # Read on the server loop, shown from the Tk loop
+            future = server.submit_to_server(server.metrics_summary)
+            future.add_done_callback(lambda future: self.master.pump.call(lambda: self.show_metrics(future)))
+        except RuntimeError:
+            pass  # Not up yet
+        self.after(1000, self.poll_metrics)
+
+    def show_metrics(self, future):
+        from app import metrics
+        try:
+            summary = future.result()
+        except Exception:
+            return
+        now = time.monotonic()
+        last, self.last_metrics = self.last_metrics, (now, summary)
+        if last is None:
+            return
+        then, previous = last
+        elapsed = max(now - then, 1e-3)
+
+        def recent_p99(histogram, key):
+            counts = [a - b for a, b in zip(summary[key], previous[key])]
+            value = metrics.quantile(histogram.bounds, counts, 0.99)
+            return "-" if value is None else f"{value * 1000:.2f} ms"
+
+        self.metrics_label.configure(text=(
+            f"{summary['connections']} connections  {summary['spectators']} spectators  "
+            f"in {(summary['received'] - previous['received']) / elapsed:.0f}/s  "
+            f"out {(summary['sent'] - previous['sent']) / elapsed:.0f}/s  "
+            f"broadcast p99 {recent_p99(metrics.broadcast_seconds, 'broadcast')}  "
+            f"loop lag p99 {recent_p99(metrics.loop_lag_seconds, 'loop_lag')}  "
+            f"round state {summary['round_state_bytes'] / 1024:.1f} kB"
+        ))
+
+    def stop_server_connection(self):
+        if self.subscribed:
+            from app import server
+            server.unsubscribe(self.on_room_event)
+            self.subscribed = False
+            print("App:\tHost unsubscribed from server state.")
+
+    def on_room_event(self, data):
+        # Called on the server loop, only touches the feed and the UI pump
+        if data.get("type") in (protocol.USERS, protocol.USERS_DELTA):
+            change = self.user_list.apply(data)
+            if change is None:
+                from app import server
+                self.on_room_event(server.default_room.users_snapshot())
+            elif change:
+                self.update_connected_users()
+        elif data.get("type") == protocol.PRESENCE:
+            # Periodic RTT and last-seen report for the users list
+            self.presence = {info["user"]: info for info in data["users"]}
+            self.update_connected_users()
+        elif data.get("type") in (protocol.SNAPSHOT, protocol.PRESS_APPENDED, protocol.ROUND_RESET):
+            change = self.feed.apply(data)
+            if change:
+                self.update_round_state(self.feed.state)
+            if change is None:
+                from app import server
+                room = server.default_room
+                self.on_room_event(protocol.snapshot(room.press_seq, room.latest_presses, room.round.state))
+            elif change == protocol.SNAPSHOT:
+                self.update_latest_presses(self.feed.lines(latency=True))
+            elif change == protocol.PRESS_APPENDED:
+                if self.feed.last_index == len(self.feed.presses) - 1:
+                    first_ns = self.feed.presses[0]["corrected_ns"]
+                    self.update_text(protocol.format_press(data["press"], first_ns, latency=True))
+                else:
+                    self.update_latest_presses(self.feed.lines(latency=True))
+            elif change == protocol.ROUND_RESET:
+                self.update_latest_presses([])
+
+    def update_connected_users(self):
+        lines = [protocol.format_presence(self.presence.get(user, {"user": user})) for user in self.user_list.users]
+        self.master.pump.set_lines(self.users_view, lines)
+
+    def update_latest_presses(self, latest_presses):
+        self.master.pump.set_lines(self.press_view, latest_presses)
+
+    def save_to_history(self):
+        def saved(future):
+            try:
+                winner = future.result()
+                print(f"App:\tStatus: {'Saved to history' if winner is not None else 'Nothing to save'}")
+            except Exception as e:
+                print(f"App:\tError saving to history: {e}")
+
+        from app import server
+        try:
+            server.submit_to_server(server.default_room.save_round).add_done_callback(saved)
+        except RuntimeError as e:
+            print(f"App:\tError saving to history: {e}")
+
+    def set_accept_limit(self, choice):
+        def configured(future):
+            try:
+                print(f"App:\tRound is {future.result().get('state')}, accepting {choice.lower()}")
+            except Exception as e:
+                print(f"App:\tError configuring round: {e}")
+
+        from app import server
+        try:
+            limit = self.ACCEPT_LIMITS[choice]
+            server.submit_to_server(server.default_room.configure_round, limit).add_done_callback(configured)
+        except RuntimeError as e:
+            print(f"App:\tError configuring round: {e}")
+
+    def update_round_state(self, state):
+        text = f"Host Screen - Round {state}" if state else "Host Screen"
+        self.master.pump.call(lambda: self.label.configure(text=text))
+
+    def update_text(self, text):
+        self.master.pump.append_line(self.press_view, text)
+
+    def on_resize(self, event):
+        height = event.height
+        new_label_size = max(12, int(height / 25))
+        new_button_size = max(10, int(height / 30))
+        self.label_font.configure(size=new_label_size)
+        self.button_font.configure(size=new_button_size)
+
+    def start_server(self):
+        if not self.server_running:
+            import uvicorn
+            from app.server import app as fastapi_app
+            # log_config=None leaves uvicorn's loggers to the console sink
+            config = uvicorn.Config(fastapi_app, host="0.0.0.0", port=6969, log_level="info", log_config=None)
+            self.server = uvicorn.Server(config)
+
+            def run_server():
+                self.server_running = True
+                self.server.run()
+                self.server_running = False
+
+            self.server_thread = threading.Thread(target=run_server, daemon=True)
+            self.server_thread.start()
+            print("App:\tFastAPI server started.")
+            self.announcer.start()
+
+    def stop_server(self):
+        if self.server_running and self.server:
+            self.server.should_exit = True  # Graceful stop signal
+            print("App:\tStopping FastAPI server...")
+        self.announcer.stop()
+
+
+class HistoryScreen(ctk.CTkFrame):
+    ALL_PLAYERS = "All players"
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.grid_rowconfigure((0, 1), weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.label_font = ctk.CTkFont(size=16)
+        self.button_font = ctk.CTkFont(size=14)
+
+        self.label = ctk.CTkLabel(self, text="Press History", font=self.label_font)
+        self.label.grid(row=0, column=0, pady=10, sticky="s")
+
+        history_frame, self.history_view = virtual_list(self)
+        history_frame.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+
+        # Rounds are read from the store a page at a time, later visits only
+        # fetch the rounds saved since. first/last_number are the loaded range.
+        self.first_number = None
+        self.last_number = None
+        self.player = None  # Only show rounds this player pressed in
+        page_frame = ctk.CTkFrame(self, fg_color="transparent")
+        page_frame.grid(row=2, column=0, padx=50, pady=5, sticky="nsew")
+        page_frame.grid_columnconfigure((0, 1, 2), weight=1)
+
+        self.older_button = ctk.CTkButton(page_frame, text="Load Older", command=self.show_older, font=self.button_font)
+        self.older_button.grid(row=0, column=0, padx=(0, 5), sticky="ew")
+
+        self.player_menu = ctk.CTkComboBox(page_frame, values=[self.ALL_PLAYERS], command=self.set_player, font=self.button_font)
+        self.player_menu.set(self.ALL_PLAYERS)
+        self.player_menu.bind("<Return>", lambda event: self.set_player(self.player_menu.get()))
+        self.player_menu.grid(row=0, column=1, padx=5, sticky="ew")
+
+        self.leaderboard_button = ctk.CTkButton(page_frame, text="Leaderboard", command=lambda: master.show_frame(LeaderboardScreen), font=self.button_font)
+        self.leaderboard_button.grid(row=0, column=2, padx=(5, 0), sticky="ew")
+
+        self.back_button = ctk.CTkButton(self, text="Back to Host", command=self.back_to_host, font=self.button_font)
+        self.back_button.grid(row=3, column=0, padx=50, pady=5, sticky="nsew")
+
+        self.bind("<Configure>", self.on_resize)
+
+    def back_to_host(self):
+        self.master.show_frame(HostScreen)
+
+    def on_resize(self, event):
+        height = event.height
+        new_label_size = max(12, int(height / 25))
+        new_button_size = max(10, int(height / 30))
+        self.label_font.configure(size=new_label_size)
+        self.button_font.configure(size=new_button_size)
+
+    def page(self, after=None, before=None):
+        # Only reachable from the host screen, so the server is loaded already
+        from app import server
+        return server.history_store.page(server.DEFAULT_ROOM, after, before, server.HISTORY_PAGE_SIZE, self.player)
+
+    def update_history(self):
+        from app import server
+        self.player_menu.configure(values=[self.ALL_PLAYERS, *server.history_store.players(server.DEFAULT_ROOM)])
+        if self.last_number is None:
+            self.show_newest()
+            return
+        # Append whatever was saved since the last visit
+        while True:
+            rounds = self.page(after=self.last_number)
+            if rounds:
+                self.last_number = rounds[-1]["number"]
+                self.master.pump.append_lines(self.history_view, [self.format_round(saved_round) for saved_round in rounds])
+            if len(rounds) < server.HISTORY_PAGE_SIZE:
+                break
+
+    def show_newest(self):
+        rounds = self.page()
+        self.first_number = rounds[0]["number"] if rounds else None
+        self.last_number = rounds[-1]["number"] if rounds else None
+        self.master.pump.set_lines(self.history_view, [self.format_round(saved_round) for saved_round in rounds])
+
+    def show_older(self):
+        if self.first_number is None:
+            return
+        rounds = self.page(before=self.first_number)
+        if rounds:
+            self.first_number = rounds[0]["number"]
+            self.master.pump.prepend_lines(self.history_view, [self.format_round(saved_round) for saved_round in rounds])
+
+    def set_player(self, choice):
+        player = None if choice in (self.ALL_PLAYERS, "") else choice
+        if player != self.player:
+            self.player = player
+            self.show_newest()
+
+    @staticmethod
+    def format_round(saved_round):
+        presses = protocol.format_presses(saved_round["presses"], latency=True)
+        return f"Round {saved_round['number']}: {', '.join(presses)}"
+
+
+class LeaderboardScreen(ctk.CTkFrame):
+    def __init__(self, master):
+        super().__init__(master)
+        self.master = master
+
+        self.grid_rowconfigure((0, 1), weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.label_font = ctk.CTkFont(size=16)
+        self.button_font = ctk.CTkFont(size=14)
+
+        self.label = ctk.CTkLabel(self, text="Leaderboard", font=self.label_font)
+        self.label.grid(row=0, column=0, pady=10, sticky="s")
+
+        self.textbox = ctk.CTkTextbox(self)
+        self.textbox.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        self.textbox.configure(state="disabled")
+        self.leaderboard_view = LineView(self.textbox)
+
+        self.back_button = ctk.CTkButton(self, text="Back to History", command=lambda: master.show_frame(HistoryScreen), font=self.button_font)
+        self.back_button.grid(row=2, column=0, padx=50, pady=5, sticky="nsew")
+
+        self.bind("<Configure>", self.on_resize)
+
+    def on_resize(self, event):
+        height = event.height
+        new_label_size = max(12, int(height / 25))
+        new_button_size = max(10, int(height / 30))
+        self.label_font.configure(size=new_label_size)
+        self.button_font.configure(size=new_button_size)
+
+    def update_leaderboard(self):
+        # Stats are kept up to date incrementally, this only reads new rounds
+        from app import server
+        leaderboard = server.analytics.leaderboard(server.DEFAULT_ROOM)
+        self.label.configure(text=f"Leaderboard - {leaderboard['rounds']} rounds")
+        lines = [format_player(rank, info) for rank, info in enumerate(leaderboard["players"], 1)]
+        self.master.pump.set_lines(self.leaderboard_view, lines)
@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    saved_at REAL NOT NULL,
+    winner TEXT,
+    presses TEXT NOT NULL,
+    armed_ns INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS rounds_room_number ON rounds (room, number);
+CREATE INDEX IF NOT EXISTS rounds_room_saved_at ON rounds (room, saved_at);
+-- Which users pressed in which rounds, for finding a player's rounds
+-- without reading every round's presses
+CREATE TABLE IF NOT EXISTS round_players (
+    room TEXT NOT NULL,
+    user TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (room, user, number)
+) WITHOUT ROWID;
+"""
+
+MAX_PAGE = 500
+
+
+class HistoryStore:
+    # Append-only store of saved rounds. Rounds live on disk rather than in
+    # memory and are read back one page at a time by (room, number).
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Stores from before rounds kept their arm time
+        columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(rounds)")]
+        if "armed_ns" not in columns:
+            self.conn.execute("ALTER TABLE rounds ADD COLUMN armed_ns INTEGER")
+        # Stores from before the player index
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            with self.conn:
+                for row in self.conn.execute("SELECT room, number, presses FROM rounds").fetchall():
+                    self.index_players(row["room"], row["number"], json.loads(row["presses"]))
+                self.conn.execute("PRAGMA user_version = 1")
+
+    def append(self, room, number, presses, winner=None, saved_at=None, armed_ns=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO rounds (room, number, saved_at, winner, presses, armed_ns) VALUES (?, ?, ?, ?, ?, ?)",
+                (room, number, saved_at or time.time(), winner, json.dumps(presses), armed_ns),
+            )
+            self.index_players(room, number, presses)
+
+    def index_players(self, room, number, presses):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO round_players (room, user, number) VALUES (?, ?, ?)",
+            [(room, user, number) for user in {press["user"] for press in presses}],
+        )
+
+    def last_number(self, room):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(number) FROM rounds WHERE room = ?", (room,)).fetchone()
+        return row[0] or 0
+
+    def page(self, room, after=None, before=None, limit=50, player=None):
+        # Keyset paging on round number: after= walks forward from a round,
+        # before= walks back from one. With neither the newest page is returned.
+        # Rounds always come back oldest first. player= only returns rounds
+        # that player pressed in, walking the player index instead.
+        limit = max(1, min(limit, MAX_PAGE))
+        if player is None:
+            source, key, where, params = "rounds", "number", "room = ?", (room,)
+        else:
+            # CROSS JOIN keeps SQLite walking the index first
+            source, key = "round_players CROSS JOIN rounds USING (room, number)", "round_players.number"
+            where, params = "round_players.room = ? AND round_players.user = ?", (room, player)
+        with self.lock:
+            if after is not None:
+                rows = self.conn.execute(
+                    f"SELECT rounds.* FROM {source} WHERE {where} AND {key} > ? ORDER BY {key} LIMIT ?",
+                    (*params, after, limit),
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    f"SELECT rounds.* FROM {source} WHERE {where} AND {key} < ? ORDER BY {key} DESC LIMIT ?",
+                    (*params, before if before is not None else 2 ** 62, limit),
+                ).fetchall()
+                rows.reverse()
+        return [self.to_round(row) for row in rows]
+
+    def players(self, room):
+        # Everyone with a saved press in the room, by name
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT user FROM round_players WHERE room = ? ORDER BY user", (room,)).fetchall()
+        return [row[0] for row in rows]
+
+    def since(self, room, saved_after, limit=50):
+        limit = max(1, min(limit, MAX_PAGE))
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM rounds WHERE room = ? AND saved_at > ? ORDER BY saved_at LIMIT ?",
+                (room, saved_after, limit),
+            ).fetchall()
+        return [self.to_round(row) for row in rows]
+
+    @staticmethod
+    def to_round(row):
+        return {
+            "number": row["number"],
+            "saved_at": row["saved_at"],
+            "winner": row["winner"],
+            "presses": json.loads(row["presses"]),
+            "armed_ns": row["armed_ns"],
+        }
@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from app import protocol
+from app import wire
+
+logger = logging.getLogger(__name__)
+
+# Keys that count as a buzzer press, comma separated names as the keyboard
+# package spells them ("space", "enter", "f"...)
+PRESS_KEYS = [key.strip() for key in os.environ.get("PARTY_PRESS_KEYS", "space").split(",") if key.strip()]
+
+# Tk spells a few keys differently
+TK_KEYSYMS = {"enter": "Return", "esc": "Escape", "tab": "Tab", "backspace": "BackSpace", "shift": "Shift_L", "ctrl": "Control_L"}
+
+# websocket-client frame opcodes, kept here so the module loads without it
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+
+
+class LatencyStats:
+    # Recent key-down to socket write times, in nanoseconds
+    def __init__(self, maxlen=1000):
+        self.samples: deque[int] = deque(maxlen=maxlen)
+        self.count = 0
+
+    def add(self, latency_ns):
+        self.samples.append(latency_ns)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count}
+        ordered = sorted(self.samples)
+
+        def pick(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1e6
+
+        return {
+            "count": self.count,
+            "p50_ms": pick(0.50),
+            "p99_ms": pick(0.99),
+            "max_ms": ordered[-1] / 1e6,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        if "p50_ms" not in summary:
+            return "no presses"
+        return (f"{summary['count']} presses, p50 {summary['p50_ms']:.2f} ms, "
+                f"p99 {summary['p99_ms']:.2f} ms, max {summary['max_ms']:.2f} ms")
+
+
+class PressSender:
+    # The only thing that writes to the guest's socket. Key handlers call
+    # press(), which stamps the time, builds the frame and queues it; the
+    # sender thread does the write. Pongs and other replies go through
+    # send() so nothing else touches the socket.
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.ws = None
+        self.name = ""
+        self.binary = False
+        self.thread = None
+        self.stats = LatencyStats()
+        # The JSON press around its timestamp, only the number changes per press
+        self.text_prefix = self.text_suffix = ""
+
+    def start(self, ws, name):
+        self.stop()
+        self.ws = ws
+        self.name = name
+        self.binary = False
+        # client_ns is the last field, so the last match is the timestamp
+        # even if the name happens to contain the same text
+        template = protocol.press_message(name, 0)
+        head, self.text_suffix = template.rsplit('"client_ns": 0', 1)
+        self.text_prefix = head + '"client_ns": '
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, args=(ws, self.queue), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.queue.put(None)
+            self.thread = None
+        self.ws = None
+
+    def press(self, *_):
+        pressed_ns = time.monotonic_ns()
+        if self.ws is None:
+            return
+        if self.binary:
+            self.queue.put((pressed_ns, wire.encode_press(pressed_ns), OPCODE_BINARY))
+        else:
+            self.queue.put((pressed_ns, self.text_prefix + str(pressed_ns) + self.text_suffix, OPCODE_TEXT))
+
+    def send(self, message):
+        self.queue.put((None, message, OPCODE_BINARY if isinstance(message, bytes) else OPCODE_TEXT))
+
+    def run(self, ws, frames):
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            pressed_ns, message, opcode = item
+            try:
+                ws.send(message, opcode)
+            except Exception as e:
+                logger.warning("Failed to send: %s", e)
+                continue
+            if pressed_ns is not None:
+                latency_ns = time.monotonic_ns() - pressed_ns
+                self.stats.add(latency_ns)
+                logger.debug("Sent press, %.2f ms after key down", latency_ns / 1e6)
+
+
+class KeyBindings:
+    # Calls on_press for every key down of the press keys. Uses the global
+    # keyboard hook so it works while the window isn't focused, and falls
+    # back to Tk bindings when the hook can't be installed (no keyboard
+    # package, or no permission to read input devices).
+    def __init__(self, window, keys, on_press):
+        self.window = window
+        self.keys = keys
+        self.on_press = on_press
+        self.held: set[str] = set()
+        self.hooks = []
+        self.tk_bindings = []
+        self.mode = None
+
+    def start(self):
+        if self.mode:
+            return self.mode
+        try:
+            import keyboard
+            for key in self.keys:
+                self.hooks.append(keyboard.on_press_key(key, self.key_down))
+                self.hooks.append(keyboard.on_release_key(key, self.key_up))
+            self.mode = "global"
+        except Exception as e:
+            self.remove_hooks()
+            print(f"App:\tGlobal key hook unavailable ({e!r}), using window key bindings")
+            for key in self.keys:
+                keysym = TK_KEYSYMS.get(key, key)
+                self.window.bind_all(f"<KeyPress-{keysym}>", self.tk_key_down, add="+")
+                self.window.bind_all(f"<KeyRelease-{keysym}>", self.tk_key_up, add="+")
+                self.tk_bindings += [f"<KeyPress-{keysym}>", f"<KeyRelease-{keysym}>"]
+            self.mode = "window"
+        return self.mode
+
+    def stop(self):
+        self.remove_hooks()
+        for sequence in self.tk_bindings:
+            self.window.unbind_all(sequence)
+        self.tk_bindings = []
+        self.held.clear()
+        self.mode = None
+
+    def remove_hooks(self):
+        if self.hooks:
+            import keyboard
+            for hook in self.hooks:
+                try:
+                    keyboard.unhook(hook)
+                except (KeyError, ValueError):
+                    pass
+        self.hooks = []
+
+    def key_down(self, event):
+        # Auto-repeat sends more key downs while the key is held, only the
+        # first one is a press
+        if event.name in self.held:
+            return
+        self.held.add(event.name)
+        self.on_press()
+
+    def key_up(self, event):
+        self.held.discard(event.name)
+
+    def tk_key_down(self, event):
+        # Don't steal typing from entry fields
+        if event.widget.winfo_class() == "Entry":
+            return
+        if event.keysym in self.held:
+            return
+        self.held.add(event.keysym)
+        self.on_press()
+
+    def tk_key_up(self, event):
+        self.held.discard(event.keysym)
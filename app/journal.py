@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import time
+from app.clock import now_ns
+
+logger = logging.getLogger(__name__)
+
+# Events that only refresh connection quality, too frequent and too
+# short-lived to be worth keeping
+UNJOURNALED = {"presence"}
+
+
+class Journal:
+    # Append-only log of every room event the process applies, one JSON line
+    # each with the wall clock and server clock at the time. Every
+    # snapshot_every events the registry's state is written to a snapshot
+    # next to the log, along with how far into the log it goes, so a restart
+    # only replays the lines after it. The log itself is never rewritten and
+    # doubles as an audit trail of who pressed when.
+    def __init__(self, path, snapshot_every=1000):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.snapshot_every = snapshot_every
+        self.file = None
+        self.since_snapshot = 0
+
+    def open(self):
+        if self.file is not None:
+            return
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self.file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Line cut short by a crash, keep it apart from the next one
+                    self.file.write("\n")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def record(self, room, event):
+        # Written before the event is applied. Returns True when it's time
+        # for a snapshot.
+        if self.file is None or event["kind"] in UNJOURNALED:
+            return False
+        self.file.write(json.dumps({"t": time.time(), "ns": now_ns(), "room": room, "event": event}) + "\n")
+        # Flushed to the OS each time, so a crash of the process loses nothing
+        self.file.flush()
+        self.since_snapshot += 1
+        return self.since_snapshot >= self.snapshot_every
+
+    def write_snapshot(self, rooms):
+        if self.file is None:
+            return
+        snapshot = {"t": time.time(), "ns": now_ns(), "offset": self.file.tell(), "rooms": rooms}
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.snapshot_path)
+        self.since_snapshot = 0
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning("Ignoring unreadable journal snapshot %s: %r", self.snapshot_path, e)
+            return None
+
+    def entries(self, offset=0):
+        # Log lines from a byte offset on. A line cut short by a crash can
+        # only be the last one and is skipped.
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping damaged journal line in %s", self.path)
+
+
+def read(path):
+    # Every entry of a journal from the start, for offline tools
+    return Journal(path).entries()
@@ -0,0 +1,153 @@
+import asyncio
+import os
+from bisect import bisect_left
+
+# In-process instruments for the server, cheap enough to leave on: a counter
+# is an integer add, a histogram a bisect into fixed buckets, and anything
+# that has to walk room state is only computed when metrics are read.
+# Everything is per process, with several workers each one reports its own.
+
+TIME_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LOOP_LAG_INTERVAL = float(os.environ.get("PARTY_LOOP_LAG_INTERVAL", 0.25))
+
+instruments = []
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, **labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+        instruments.append(self)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+
+class Gauge:
+    # Computed by fn when read. fn returns a number or a list of (labels, value).
+    type = "gauge"
+
+    def __init__(self, name, help, fn, **labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.fn = fn
+        instruments.append(self)
+
+    def samples(self):
+        value = self.fn()
+        if isinstance(value, list):
+            return [(self.name, {**self.labels, **labels}, sample) for labels, sample in value]
+        return [(self.name, self.labels, value)]
+
+
+class CounterView(Gauge):
+    # A count kept somewhere else, read through fn
+    type = "counter"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=TIME_BUCKETS, **labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        instruments.append(self)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        samples = []
+        seen = 0
+        for bound, count in zip(self.bounds + [float("inf")], self.counts):
+            seen += count
+            samples.append((self.name + "_bucket", {**self.labels, "le": format_value(bound)}, seen))
+        samples.append((self.name + "_sum", self.labels, self.sum))
+        samples.append((self.name + "_count", self.labels, self.count))
+        return samples
+
+
+messages_received_text = Counter("party_messages_received_total", "Websocket messages received", kind="text")
+messages_received_binary = Counter("party_messages_received_total", "Websocket messages received", kind="binary")
+messages_sent_text = Counter("party_messages_sent_total", "Websocket messages sent", kind="text")
+messages_sent_binary = Counter("party_messages_sent_total", "Websocket messages sent", kind="binary")
+json_decode_seconds = Histogram("party_json_decode_seconds", "Time spent in json.loads per message")
+json_encode_seconds = Histogram("party_json_encode_seconds", "Time spent in json.dumps per broadcast event")
+broadcast_seconds = Histogram("party_broadcast_seconds", "Time to queue one frame for every client of a room")
+frame_cache_hits = Counter("party_frame_cache_total", "State frames served from the cache or encoded", result="hit")
+frame_cache_misses = Counter("party_frame_cache_total", "State frames served from the cache or encoded", result="miss")
+loop_lag_seconds = Histogram("party_event_loop_lag_seconds", "How late the event loop ran a timer", LAG_BUCKETS)
+
+
+def quantile(bounds, counts, q):
+    # Upper bound of the bucket the quantile falls in, None without samples.
+    # counts may be the difference of two readings, for a recent window.
+    total = sum(counts)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for bound, count in zip(bounds, counts):
+        seen += count
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+async def watch_loop(interval=LOOP_LAG_INTERVAL):
+    # Sleeps for interval and records how much later than that it woke up,
+    # anything blocking the loop shows up as lag
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, loop.time() - start - interval))
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def escape(value):
+    # Label values can come from URLs (room names), quoted per the text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render(**labels):
+    # Prometheus text format, labels are added to every sample
+    lines = []
+    described = set()
+    for instrument in instruments:
+        if instrument.name not in described:
+            described.add(instrument.name)
+            lines.append(f"# HELP {instrument.name} {instrument.help}")
+            lines.append(f"# TYPE {instrument.name} {instrument.type}")
+        for name, sample_labels, value in instrument.samples():
+            lines.append(f"{name}{format_labels({**labels, **sample_labels})} {format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,190 @@
+import json
+import time
+from bisect import bisect
+
+# Press updates are sent as sequence numbered deltas. Every delta bumps the
+# sequence by one, so a client that sees a jump knows it missed something and
+# asks for a fresh snapshot instead of trusting its local list.
+SNAPSHOT = "snapshot"
+PRESS_APPENDED = "press_appended"
+ROUND_RESET = "round_reset"
+PING = "ping"
+
+USERS = "users"
+USERS_DELTA = "users_delta"
+PRESENCE = "presence"
+
+# Path segment of the spectator routes, so it can't be a player or room name
+SPECTATE = "spectate"
+RESERVED_NAMES = {SPECTATE}
+
+
+# Events are plain dicts so in-process subscribers can use them without any
+# encoding. Feed events reach sockets through Room.fan_out, which encodes
+# each one once (app/frames.py), the *_message helpers are for the rest.
+def snapshot(seq, latest_presses, state=None):
+    return {"type": SNAPSHOT, "seq": seq, "latest_presses": list(latest_presses), "state": state}
+
+
+def press_appended(seq, press, winner, state=None):
+    return {"type": PRESS_APPENDED, "seq": seq, "press": press, "winner": winner, "state": state}
+
+
+def round_reset(seq, state=None):
+    return {"type": ROUND_RESET, "seq": seq, "state": state}
+
+
+def users(connected_users, version=None):
+    return {"type": USERS, "connected_users": list(connected_users), "version": version}
+
+
+def users_delta(version, joined, left):
+    # Users that joined or left since the previous version. Names can repeat,
+    # the same name on two connections counts twice.
+    return {"type": USERS_DELTA, "version": version, "joined": list(joined), "left": list(left)}
+
+
+def presence(users):
+    # users are dicts with "user", "rtt_ms" and "last_seen" (epoch seconds)
+    return {"type": PRESENCE, "users": list(users)}
+
+
+def snapshot_message(seq, latest_presses, state=None):
+    return json.dumps(snapshot(seq, latest_presses, state))
+
+
+def snapshot_request_message(name):
+    return json.dumps({"user": name, "action": "snapshot_request", "payload": None})
+
+
+def ping_message(server_ns):
+    return json.dumps({"type": PING, "server_ns": server_ns})
+
+
+def pong_message(name, server_ns):
+    return json.dumps({
+        "user": name,
+        "action": "pong",
+        "payload": {"server_ns": server_ns, "client_ns": time.monotonic_ns()}
+    })
+
+
+def press_message(name, client_ns=None):
+    return json.dumps({
+        "user": name,
+        "action": "button_press",
+        "payload": {"client_ns": client_ns if client_ns is not None else time.monotonic_ns()}
+    })
+
+
+def make_press(user, server_ns, corrected_ns, client_ns=None, rtt_ns=None):
+    # server_ns is when the press was received, corrected_ns is the client's
+    # own timestamp mapped onto the server clock (or server_ns without one)
+    return {
+        "user": user,
+        "server_ns": server_ns,
+        "corrected_ns": corrected_ns,
+        "client_ns": client_ns,
+        "rtt_ns": rtt_ns,
+        "latency_ns": server_ns - corrected_ns,
+    }
+
+
+def press_key(press):
+    return press["corrected_ns"], press["server_ns"]
+
+
+def round_winner(presses):
+    if not presses:
+        return None
+    return min(presses, key=press_key)["user"]
+
+
+def format_press(press, first_ns=None, latency=False):
+    text = press["user"]
+    if first_ns is not None and press["corrected_ns"] > first_ns:
+        text += f"  +{(press['corrected_ns'] - first_ns) / 1e6:.1f} ms"
+    if latency:
+        text += f"  (latency {press['latency_ns'] / 1e6:.1f} ms)"
+    return text
+
+
+def format_presses(presses, latency=False):
+    ordered = sorted(presses, key=press_key)
+    first_ns = ordered[0]["corrected_ns"] if ordered else None
+    return [format_press(press, first_ns, latency) for press in ordered]
+
+
+def format_presence(info, now=None):
+    text = info["user"]
+    if info.get("rtt_ms") is not None:
+        text += f"  {info['rtt_ms']:.0f} ms"
+    if info.get("last_seen") is not None:
+        text += f"  seen {max(0.0, (now or time.time()) - info['last_seen']):.0f}s ago"
+    return text
+
+
+class PressFeed:
+    # Keeps the presses of the current round ordered by corrected time, which
+    # isn't necessarily the order the server received them in
+    def __init__(self):
+        self.presses: list[dict] = []
+        self.seq = None  # None until the first snapshot arrives
+        self.last_index = None  # Where the last appended press was placed
+        self.state = None  # Round state as of the last applied message
+
+    def apply(self, data):
+        # Returns the kind of change that was applied, "" for messages that are
+        # ignored, or None when a gap was found and a snapshot has to be requested
+        kind = data.get("type")
+        if kind == SNAPSHOT:
+            self.state = data.get("state")
+            self.presses = sorted(data.get("latest_presses", []), key=press_key)
+            self.seq = data["seq"]
+            return SNAPSHOT
+
+        if self.seq is None or data["seq"] <= self.seq:
+            return ""  # Waiting for a snapshot, or already covered by one
+        if data["seq"] != self.seq + 1:
+            self.seq = None
+            return None
+
+        self.seq = data["seq"]
+        self.state = data.get("state")
+        if kind == PRESS_APPENDED:
+            press = data["press"]
+            self.last_index = bisect(self.presses, press_key(press), key=press_key)
+            self.presses.insert(self.last_index, press)
+        elif kind == ROUND_RESET:
+            self.presses.clear()
+        return kind
+
+    def lines(self, latency=False):
+        return format_presses(self.presses, latency)
+
+
+class UserList:
+    # Connected users from a users snapshot plus the deltas after it
+    def __init__(self):
+        self.users: list[str] = []
+        self.version = None  # None until the first snapshot arrives
+
+    def apply(self, data):
+        # Same return values as PressFeed.apply
+        if data.get("type") == USERS:
+            self.users = list(data.get("connected_users", []))
+            self.version = data.get("version")
+            return USERS
+
+        if self.version is None or data["version"] <= self.version:
+            return ""
+        if data["version"] != self.version + 1:
+            self.version = None
+            return None
+
+        self.version = data["version"]
+        for name in data["left"]:
+            if name in self.users:
+                self.users.remove(name)
+        self.users.extend(data["joined"])
+        return USERS_DELTA
@@ -0,0 +1,745 @@
+import asyncio
+import itertools
+import json
+import logging
+import secrets
+import sys
+import time
+from collections import Counter, deque
+from fastapi import WebSocket
+from app import metrics
+from app import protocol
+from app import wire
+from app.backend import WORKER_ID, MemoryBackend
+from app.broadcast import COALESCE, Broadcaster
+from app.clock import ClockSync, now_ns
+from app.frames import EventFrames, FrameCache
+from app.history import HistoryStore
+from app.round import Round
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOM = "default"
+
+connection_ids = itertools.count(1)
+
+# What spectators are sent after each kind of room event: the latest state it
+# led to rather than the event, so missing some along the way is harmless.
+# Presence is only of interest to the host.
+SPECTATOR_FRAMES = {
+    protocol.SNAPSHOT: protocol.SNAPSHOT,
+    protocol.PRESS_APPENDED: protocol.SNAPSHOT,
+    protocol.ROUND_RESET: protocol.SNAPSHOT,
+    protocol.USERS_DELTA: protocol.USERS,
+}
+
+
+class Room:
+    # Changes to a room are submitted as events to the state backend and only
+    # take effect when the backend hands them back to apply(). With the memory
+    # backend that happens immediately, with a shared backend every worker
+    # applies the same events in the same order. Sockets, clock sync and
+    # in-process listeners are local to the worker.
+    def __init__(self, name, store=None, backend=None, accept_limit=None, debounce=True, queue_size=64,
+                 slow_client_policy="coalesce", send_timeout=5.0, resume_grace=30.0, replay_events=256,
+                 presence_window=0.1, spectator_interval=0.25):
+        self.name = name
+        self.presence_window = presence_window
+        self.send_timeout = send_timeout
+        self.resume_grace = resume_grace
+        self.store = store or HistoryStore()
+        self.backend = backend
+        # Saved rounds only live in the store, numbering carries on from there
+        # unless a shared event log already has saves for the room. Either
+        # way every save event carries its number, see apply_save.
+        last_number = backend.last_number(name) if backend is not None else None
+        if last_number is None:
+            last_number = self.store.last_number(name)
+        self.round = Round(accept_limit, debounce, number=last_number + 1)
+        self.latest_presses: list[dict] = self.round.presses
+        self.press_seq = 0
+        # Registered users on this worker, by socket
+        self.user_connections: dict[WebSocket, str] = {}
+        # Registered users on every worker, by connection ID
+        self.members: dict[str, str] = {}
+        # Joins and leaves are collected for presence_window seconds and sent
+        # as one versioned delta, +1 per join and -1 per leave of a name.
+        # Versions are per worker, clients only ever see one worker's.
+        self.users_version = 0
+        self.users_pending: Counter[str] = Counter()
+        # IDs handed out since the last delta, sent to binary clients with it
+        # as one user_ids frame
+        self.user_ids_pending: dict[str, int] = {}
+        self.users_flush = None
+        self.connections: dict[str, WebSocket] = {}
+        self.conn_ids: dict[WebSocket, str] = {}
+        # Resume tokens, a user that drops can come back on a new connection
+        # within resume_grace seconds and take over their old membership
+        self.tokens: dict[str, str] = {}
+        self.conn_tokens: dict[str, str] = {}
+        # Recent feed events with their encoded frames, replayed to resuming
+        # clients that missed them
+        self.recent: deque[EventFrames] = deque(maxlen=replay_events)
+        # Encoded snapshot, user list and user ID frames, shared by every
+        # socket that needs them until the state they describe changes
+        self.frames = FrameCache()
+        # Small IDs for user names, used by binary framing. IDs are never
+        # reused while the room lives so cached maps on clients stay valid.
+        self.user_ids: dict[str, int] = {}
+        self.clocks: dict[WebSocket, ClockSync] = {}
+        # Last time anything arrived on each socket (monotonic), sockets that
+        # go quiet for longer than the heartbeat timeout are reaped
+        self.last_seen: dict[WebSocket, float] = {}
+        # Connection quality of every member, reported by the worker that
+        # holds the connection. last_seen is wall clock so it means the same
+        # thing on every worker.
+        self.presence: dict[str, dict] = {}
+        self.broadcaster = Broadcaster(queue_size, slow_client_policy, send_timeout, on_failure=self.drop_client)
+        # Read-only sockets, the second tier of fan-out. Players are sent each
+        # event as it's applied, spectators get the latest snapshot and user
+        # list at most once per spectator_interval, after the players' frames
+        # are queued, and a slow spectator only ever has the newest of each
+        # waiting. However many watch, a press costs them one timer.
+        self.spectators = Broadcaster(queue_size, COALESCE, send_timeout, on_failure=self.drop_spectator)
+        self.spectator_interval = spectator_interval
+        self.spectator_changes: set[str] = set()
+        self.spectator_flush = None
+        # In-process subscribers, called on the server loop with event dicts
+        self.listeners: list = []
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def is_idle(self, ttl):
+        return (not self.broadcaster.clients and not self.spectators.clients and not self.members and not self.listeners
+                and time.monotonic() - self.last_active > ttl)
+
+    def subscribe(self, listener):
+        # Must run on the server loop, the listener starts from a snapshot and
+        # then gets the same events the sockets do, minus the JSON
+        self.listeners.append(listener)
+        listener(protocol.snapshot(self.press_seq, self.latest_presses, self.round.state))
+        listener(self.users_snapshot())
+        listener(protocol.presence(self.presence_info()))
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def notify(self, event):
+        if self.spectators.clients and event["type"] in SPECTATOR_FRAMES:
+            self.spectators_changed(SPECTATOR_FRAMES[event["type"]])
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.exception("Room listener failed: %r", e)
+
+    def submit(self, event):
+        self.touch()
+        self.backend.publish(self.name, event)
+
+    def connect(self, websocket: WebSocket, user_name):
+        self.touch()
+        client = self.broadcaster.add(websocket)
+        client.name = user_name
+        self.clocks[websocket] = ClockSync()
+        self.last_seen[websocket] = time.monotonic()
+        conn_id = f"{WORKER_ID}-{next(connection_ids)}"
+        self.connections[conn_id] = websocket
+        self.conn_ids[websocket] = conn_id
+        return client
+
+    def spectate(self, websocket: WebSocket):
+        # Spectators never register, so they're not members and don't show
+        # up in the user list or presence
+        self.touch()
+        client = self.spectators.add(websocket)
+        client.name = "spectator"
+        # Pinged like players, so a spectator that vanishes is reaped too
+        self.last_seen[websocket] = time.monotonic()
+        client.put(self.snapshot_frame(), protocol.SNAPSHOT)
+        client.put(self.users_frame(), protocol.USERS)
+        return client
+
+    def unspectate(self, websocket: WebSocket):
+        self.touch()
+        self.spectators.remove(websocket)
+        self.forget(websocket)
+
+    async def drop_spectator(self, websocket: WebSocket):
+        logger.info("Dropping slow or dead spectator in %s", self.name)
+        self.forget(websocket)
+        await self.close_quietly(websocket)
+
+    def spectators_changed(self, key):
+        self.spectator_changes.add(key)
+        if self.spectator_flush is None:
+            self.spectator_flush = asyncio.get_running_loop().call_later(self.spectator_interval, self.flush_spectators)
+
+    def flush_spectators(self):
+        self.spectator_flush = None
+        changes = self.spectator_changes
+        self.spectator_changes = set()
+        if protocol.SNAPSHOT in changes:
+            self.spectators.broadcast(self.snapshot_frame(), protocol.SNAPSHOT)
+        if protocol.USERS in changes:
+            self.spectators.broadcast(self.users_frame(), protocol.USERS)
+
+    def start_timers(self, owns):
+        # Timers belong to the loop they were set on. When the server starts
+        # again in the same process they're gone, so pending flushes are set
+        # up again and members without a connection get a fresh grace period.
+        # owns says which connection IDs this worker is in charge of.
+        self.users_flush = None
+        self.spectator_flush = None
+        self.spectator_changes.clear()  # Spectators don't outlive the loop
+        if self.users_pending:
+            self.users_flush = asyncio.get_running_loop().call_later(self.presence_window, self.flush_users)
+        gone = [conn_id for conn_id in self.members if conn_id not in self.connections and owns(conn_id)]
+        if gone:
+            self.leave_later(gone)
+
+    def stop_timers(self):
+        for handle in (self.users_flush, self.spectator_flush):
+            if handle is not None:
+                handle.cancel()
+        self.users_flush = None
+        self.spectator_flush = None
+
+    def forget(self, websocket: WebSocket):
+        # Drops local state for a socket, returns its connection ID if the
+        # user had registered
+        self.clocks.pop(websocket, None)
+        self.last_seen.pop(websocket, None)
+        conn_id = self.conn_ids.pop(websocket, None)
+        self.connections.pop(conn_id, None)
+        if self.user_connections.pop(websocket, None) is not None:
+            return conn_id
+        return None
+
+    def disconnect(self, websocket: WebSocket):
+        self.touch()
+        self.broadcaster.remove(websocket)
+        conn_id = self.forget(websocket)
+        if conn_id is not None:
+            self.leave_later([conn_id])
+
+    def leave_later(self, conn_ids):
+        # Users stay in the room for the grace period in case they resume
+        if self.resume_grace > 0:
+            asyncio.get_running_loop().call_later(self.resume_grace, self.expire, conn_ids)
+        else:
+            self.expire(conn_ids)
+
+    def expire(self, conn_ids):
+        # A resume moves the membership to a new connection ID
+        gone = [conn_id for conn_id in conn_ids if conn_id in self.members]
+        if gone:
+            self.submit({"kind": "leave", "conns": gone})
+
+    def seen(self, websocket: WebSocket):
+        # False once reap or drop_client has forgotten the socket, its handler
+        # should stop reading then rather than act for a user that has left
+        if websocket not in self.last_seen:
+            return False
+        self.last_seen[websocket] = time.monotonic()
+        return True
+
+    def reap(self, timeout):
+        # Drops every socket that hasn't sent anything, pongs included, for
+        # timeout seconds. Their leaves go out as one event so everyone gets
+        # a single users update.
+        cutoff = time.monotonic() - timeout
+        stale = [websocket for websocket, seen in self.last_seen.items() if seen < cutoff]
+        conn_ids = []
+        for websocket in stale:
+            name = self.user_connections.get(websocket)
+            if websocket in self.spectators.clients:
+                name = "spectator"
+                self.spectators.remove(websocket)
+            self.broadcaster.remove(websocket)
+            conn_id = self.forget(websocket)
+            if conn_id is not None:
+                conn_ids.append(conn_id)
+            logger.info("Reaping %s connection in %s, silent for over %gs", name or "unregistered", self.name, timeout)
+            asyncio.create_task(self.close_quietly(websocket))
+        if conn_ids:
+            self.leave_later(conn_ids)
+        return len(stale)
+
+    async def close_quietly(self, websocket: WebSocket, code=1000):
+        try:
+            await asyncio.wait_for(websocket.close(code), self.send_timeout)
+        except Exception:
+            pass
+
+    def report_presence(self):
+        # Shares the quality of this worker's connections with the room
+        now = time.monotonic()
+        users = {}
+        for websocket, conn_id in self.conn_ids.items():
+            if websocket not in self.user_connections:
+                continue
+            rtt_ns = self.clocks[websocket].last_rtt_ns
+            users[conn_id] = {
+                "rtt_ms": round(rtt_ns / 1e6, 1) if rtt_ns is not None else None,
+                "last_seen": time.time() - (now - self.last_seen[websocket]),
+            }
+        if users:
+            self.submit({"kind": "presence", "users": users})
+
+    def presence_info(self):
+        return [{"user": name, **self.presence.get(conn_id, {})} for conn_id, name in self.members.items()]
+
+    async def drop_client(self, websocket: WebSocket):
+        name = self.user_connections.get(websocket)
+        conn_id = self.forget(websocket)
+        logger.info("Dropping slow or dead client %s", name or "")
+        await self.close_quietly(websocket)
+        if conn_id is not None:
+            self.leave_later([conn_id])
+
+    def register_user(self, websocket: WebSocket, name, binary=False, resume=None, last_seq=None):
+        if websocket not in self.conn_ids:
+            return
+        self.user_connections[websocket] = name
+        client = self.broadcaster.clients.get(websocket)
+        if client:
+            client.name = name
+        if binary:
+            self.broadcaster.set_binary(websocket)
+        conn_id = self.conn_ids[websocket]
+        if resume:
+            # The fresh token is used if the old one has expired, the event
+            # carries it so every worker hands out the same one
+            self.submit({"kind": "resume", "conn": conn_id, "name": name, "token": resume, "last_seq": last_seq,
+                         "new_token": secrets.token_urlsafe(16)})
+        else:
+            self.submit({"kind": "join", "conn": conn_id, "name": name, "token": secrets.token_urlsafe(16)})
+
+    def send_to_binary(self, message):
+        if self.broadcaster.binary_clients:
+            for websocket, client in self.broadcaster.clients.items():
+                if client.binary:
+                    client.put(message)
+
+    def add_press(self, websocket: WebSocket, user, received_ns, client_ns=None):
+        clock = self.clocks.get(websocket)
+        if clock is None:
+            return
+        self.touch()
+        if not self.round.accepts(user):
+            # Locked round or repeat press, drop it without a broadcast
+            self.round.rejected += 1
+            return
+        corrected_ns = clock.to_server_time(client_ns, received_ns)
+        press = protocol.make_press(user, received_ns, corrected_ns, client_ns, clock.rtt_ns)
+        self.submit({"kind": "press", "press": press})
+
+    def save_round(self):
+        # Returns the winner as this worker sees it, None if nothing to save
+        if not self.latest_presses:
+            return None
+        winner = protocol.round_winner(self.latest_presses)
+        self.submit({"kind": "save", "origin": WORKER_ID, "number": self.round.number})
+        return winner
+
+    def configure_round(self, accept_limit=None, debounce=None):
+        self.submit({"kind": "config", "accept_limit": accept_limit, "debounce": debounce})
+        return self.round.info()
+
+    def apply(self, event):
+        kind = event["kind"]
+        if kind == "press":
+            if self.round.add(event["press"]):
+                self.broadcast_press_appended(event["press"])
+        elif kind == "join":
+            self.apply_join(event["conn"], event["name"], event["token"])
+        elif kind == "resume":
+            self.apply_resume(event["conn"], event["name"], event["token"], event["last_seq"], event.get("new_token"))
+        elif kind == "leave":
+            for conn_id in event["conns"]:
+                self.tokens.pop(self.conn_tokens.pop(conn_id, None), None)
+                self.presence.pop(conn_id, None)
+                name = self.members.pop(conn_id, None)
+                if name is not None:
+                    self.users_changed(name, -1)
+        elif kind == "presence":
+            self.presence.update((conn_id, info) for conn_id, info in event["users"].items() if conn_id in self.members)
+            self.notify(protocol.presence(self.presence_info()))
+        elif kind == "save":
+            self.apply_save(event["origin"], event.get("number"))
+        elif kind == "config":
+            previous_state = self.round.state
+            self.round.configure(event["accept_limit"], event["debounce"])
+            if self.round.state != previous_state:
+                # Let clients see the new state without a round reset
+                self.broadcast_snapshot()
+
+    def apply_join(self, conn_id, name, token):
+        self.members[conn_id] = name
+        self.tokens[token] = conn_id
+        self.conn_tokens[conn_id] = token
+        if name not in self.user_ids and len(self.user_ids) < wire.NO_USER:
+            self.user_ids[name] = self.user_ids_pending[name] = len(self.user_ids)
+        self.users_changed(name, 1)
+        websocket = self.connections.get(conn_id)
+        if websocket is not None:
+            self.send_welcome(websocket, name, token, resumed=False)
+            self.send_snapshot(websocket)
+
+    def apply_resume(self, conn_id, name, token, last_seq, new_token=None):
+        old_conn = self.tokens.get(token)
+        if old_conn is None or self.members.get(old_conn) != name:
+            # Expired or unknown token, join like anyone else. The client's
+            # token isn't reused, journals from before new_token aside.
+            self.apply_join(conn_id, name, new_token or token)
+            return
+        # Same user on a new connection, nobody else needs to hear about it
+        del self.members[old_conn]
+        del self.conn_tokens[old_conn]
+        if old_conn in self.presence:
+            self.presence[conn_id] = self.presence.pop(old_conn)
+        self.members[conn_id] = name
+        self.tokens[token] = conn_id
+        self.conn_tokens[conn_id] = token
+        websocket = self.connections.get(conn_id)
+        if websocket is not None:
+            self.send_welcome(websocket, name, token, resumed=True)
+            if not self.replay(websocket, last_seq):
+                self.send_snapshot(websocket)
+            else:
+                self.send_users(websocket)
+
+    def send_welcome(self, websocket: WebSocket, name, token, resumed):
+        client = self.broadcaster.clients.get(websocket)
+        binary = bool(client and client.binary)
+        welcome = wire.welcome_message(self.user_ids.get(name) if binary else None, binary, token, resumed)
+        self.broadcaster.send(websocket, json.dumps(welcome))
+
+    def apply_save(self, origin, number=None):
+        if not self.latest_presses:
+            return
+        if number is not None:
+            # The number the worker that took the save gave it, so workers
+            # that started later or lost the room in between line up again
+            self.round.number = number
+        winner = protocol.round_winner(self.latest_presses)
+        presses = self.round.save()
+        # Every worker applies the save, only the one that took it writes it
+        if origin == WORKER_ID:
+            try:
+                self.store.append(self.name, self.round.number, sorted(presses, key=protocol.press_key), winner,
+                                  armed_ns=self.round.armed_ns)
+            except Exception as e:
+                # The round is lost from history, the room still moves on
+                logger.error("Failed to store round %d of %s: %r", self.round.number, self.name, e)
+        self.round.rearm()
+        self.broadcast_round_reset()
+
+    def add_pong(self, websocket: WebSocket, server_ns, client_ns, received_ns):
+        clock = self.clocks.get(websocket)
+        if clock is not None:
+            clock.add_sample(server_ns, client_ns, received_ns)
+
+    async def ping_loop(self, websocket: WebSocket, burst, burst_interval, interval):
+        for i in range(burst):
+            self.send_ping(websocket)
+            await asyncio.sleep(burst_interval)
+        while True:
+            await asyncio.sleep(interval)
+            self.send_ping(websocket)
+
+    def send_ping(self, websocket: WebSocket):
+        client = self.broadcaster.clients.get(websocket) or self.spectators.clients.get(websocket)
+        if client:
+            client.put(wire.encode_ping(now_ns()) if client.binary else protocol.ping_message(now_ns()))
+
+    def next_seq(self):
+        self.press_seq += 1
+        return self.press_seq
+
+    def replay(self, websocket: WebSocket, last_seq):
+        # Sends the feed events after last_seq, False if they're not all
+        # still buffered and the client needs a snapshot instead
+        if last_seq is None or last_seq > self.press_seq:
+            return False
+        if last_seq < self.press_seq and (not self.recent or self.recent[0].event["seq"] > last_seq + 1):
+            return False
+        # A snapshot at last_seq is a state change the client hasn't seen
+        missed = [frames for frames in self.recent if frames.event["seq"] > last_seq
+                  or frames.event["type"] == protocol.SNAPSHOT and frames.event["seq"] == last_seq]
+        client = self.broadcaster.clients.get(websocket)
+        if client is None:
+            return True
+        if client.binary:
+            # IDs handed out while the client was away
+            client.put(self.user_ids_frame(), key=wire.USER_IDS)
+        for frames in missed:
+            client.put(frames.frame_for(client.binary, self.user_ids))
+        return True
+
+    def send_snapshot(self, websocket: WebSocket):
+        client = self.broadcaster.clients.get(websocket)
+        if client and client.binary:
+            # A client that lost track may have missed user IDs too
+            self.broadcaster.send(websocket, self.user_ids_frame(), key=wire.USER_IDS)
+        self.broadcaster.send(websocket, self.snapshot_frame(), key=protocol.SNAPSHOT)
+        self.send_users(websocket)
+
+    def send_users(self, websocket: WebSocket):
+        self.broadcaster.send(websocket, self.users_frame(), key=protocol.USERS)
+
+    # The versions below move with every change to what the frames describe:
+    # press_seq with each press and reset, the state with config changes,
+    # users_version with each delta (pending joins and leaves aren't in the
+    # snapshot) and the ID map only ever grows. Anything else that rewrites
+    # the state clears the cache.
+
+    def snapshot_frame(self):
+        return self.frames.get(protocol.SNAPSHOT, (self.press_seq, self.round.state), lambda: protocol.snapshot_message(
+            self.press_seq, self.latest_presses, self.round.state))
+
+    def users_frame(self):
+        return self.frames.get(protocol.USERS, self.users_version, lambda: json.dumps(self.users_snapshot()))
+
+    def user_ids_frame(self):
+        return self.frames.get(wire.USER_IDS, len(self.user_ids),
+                               lambda: json.dumps(wire.user_ids_message(self.user_ids)))
+
+    def users_snapshot(self):
+        # The user list as of the last delta, pending changes follow in the next one
+        users = Counter(self.members.values())
+        users.subtract(self.users_pending)
+        return protocol.users(users.elements(), self.users_version)
+
+    def broadcast_snapshot(self):
+        for websocket in list(self.broadcaster.clients):
+            self.send_snapshot(websocket)
+        event = protocol.snapshot(self.press_seq, self.latest_presses, self.round.state)
+        self.recent.append(EventFrames(event, self.snapshot_frame()))
+        self.notify(event)
+
+    def broadcast_press_appended(self, press):
+        if press["user"] in self.user_ids_pending:
+            # Binary clients can't read the press without the presser's ID
+            self.flush_user_ids()
+        winner = protocol.round_winner(self.latest_presses)
+        event = protocol.press_appended(self.next_seq(), press, winner, self.round.state)
+        self.recent.append(self.fan_out(event))
+
+    def broadcast_round_reset(self):
+        event = protocol.round_reset(self.next_seq(), self.round.state)
+        self.recent.append(self.fan_out(event))
+
+    def users_changed(self, name, change):
+        self.users_pending[name] += change
+        if self.presence_window <= 0:
+            self.flush_users()
+        elif self.users_flush is None:
+            self.users_flush = asyncio.get_running_loop().call_later(self.presence_window, self.flush_users)
+
+    def flush_user_ids(self):
+        pending = self.user_ids_pending
+        self.user_ids_pending = {}
+        if pending and self.broadcaster.binary_clients:
+            self.send_to_binary(json.dumps(wire.user_ids_message(pending)))
+
+    def flush_users(self):
+        self.users_flush = None
+        self.flush_user_ids()
+        pending = self.users_pending
+        self.users_pending = Counter()
+        joined = [name for name, count in pending.items() for _ in range(count)]
+        left = [name for name, count in pending.items() for _ in range(-count)]
+        if joined or left:
+            self.users_version += 1
+            self.fan_out(protocol.users_delta(self.users_version, joined, left))
+
+    def fan_out(self, event, key=None):
+        # Encodes the event once for everyone and returns the frames
+        frames = EventFrames(event)
+        binary = frames.encoded(self.user_ids) if self.broadcaster.binary_clients else None
+        self.broadcast_to_all(frames.json(), key, binary)
+        self.notify(event)
+        return frames
+
+    def broadcast_to_all(self, message, key=None, binary=None):
+        # Queues the frame on every client's writer task and returns immediately,
+        # frames with the same key may be coalesced for slow clients
+        start = time.perf_counter()
+        self.broadcaster.broadcast(message, key, binary)
+        metrics.broadcast_seconds.observe(time.perf_counter() - start)
+
+    def state_bytes(self):
+        # Rough size of the round state held in memory: the presses of the
+        # current round, the replay buffer and the cached frames. Presses are
+        # shared between the first two, so they're only counted once.
+        size = sys.getsizeof(self.latest_presses) + sys.getsizeof(self.recent) + self.frames.size()
+        presses = {id(press): press for press in self.latest_presses}
+        for frames in self.recent:
+            event = frames.event
+            size += sys.getsizeof(event) + sys.getsizeof(frames.message) + sys.getsizeof(frames.binary)
+            if "press" in event:
+                presses[id(event["press"])] = event["press"]
+        for press in presses.values():
+            size += sys.getsizeof(press) + sum(sys.getsizeof(value) for value in press.values())
+        return size
+
+    def dump(self):
+        # Game state for a journal snapshot. Sockets, clocks and the replay
+        # buffer belong to the running process and aren't included.
+        return {
+            "round": self.round.dump(),
+            "press_seq": self.press_seq,
+            "members": self.members,
+            "conn_tokens": self.conn_tokens,
+            "user_ids": self.user_ids,
+            "users_version": self.users_version,
+        }
+
+    def load(self, data):
+        self.round.load(data["round"])
+        self.press_seq = data["press_seq"]
+        self.members = dict(data["members"])
+        self.conn_tokens = dict(data["conn_tokens"])
+        self.tokens = {token: conn_id for conn_id, token in self.conn_tokens.items()}
+        self.user_ids = dict(data["user_ids"])
+        self.user_ids_pending = {}
+        self.users_version = data["users_version"]
+        self.frames.clear()
+
+    def shift_clock(self, shift_ns):
+        # Moves the round's server timestamps onto this process's clock after
+        # a restore, so new presses compare fairly with restored ones
+        self.round.armed_ns += shift_ns
+        for press in self.latest_presses:
+            press["server_ns"] += shift_ns
+            press["corrected_ns"] += shift_ns
+        self.frames.clear()
+
+    def round_info(self):
+        return {**self.round.info(), "winner": protocol.round_winner(self.latest_presses)}
+
+    def info(self):
+        return {
+            "room": self.name,
+            "users": len(self.members),
+            "connections": len(self.broadcaster.clients),
+            "spectators": len(self.spectators.clients),
+            "rounds": self.round.number - 1,
+            "idle_seconds": round(time.monotonic() - self.last_active, 1),
+        }
+
+
+class RoomRegistry:
+    def __init__(self, ttl=600.0, store=None, backend=None, journal=None, **room_settings):
+        self.ttl = ttl
+        self.store = store or HistoryStore()
+        self.backend = backend or MemoryBackend()
+        self.backend.dispatch = self.dispatch
+        self.journal = journal
+        self.room_settings = room_settings
+        self.rooms: dict[str, Room] = {}
+        self.pinned: set[str] = {DEFAULT_ROOM}
+
+    def get(self, name, create=True):
+        room = self.rooms.get(name)
+        if room is None and create:
+            room = self.rooms[name] = Room(name, self.store, self.backend, **self.room_settings)
+            logger.info("Room %s created", name)
+        return room
+
+    def dispatch(self, name, event):
+        snapshot_due = self.journal is not None and self.journal.record(name, event)
+        self.get(name).apply(event)
+        if snapshot_due:
+            self.journal.write_snapshot(self.dump())
+
+    def dump(self):
+        return {name: room.dump() for name, room in self.rooms.items()}
+
+    def restore(self):
+        # Rebuilds the rooms from the journal: the latest snapshot, then the
+        # events logged after it, applied exactly as they were the first time.
+        # Must run on the server loop before anyone connects. Returns the
+        # number of events replayed.
+        snapshot = self.journal.load_snapshot()
+        # Server timestamps in the journal are on the clock of the process
+        # that wrote them, this lines each one up with ours via the wall clock
+        base_ns = now_ns() - time.time_ns()
+
+        def clock_shift(record):
+            return base_ns - (record["ns"] - int(record["t"] * 1e9))
+
+        if snapshot is not None:
+            for name, data in snapshot["rooms"].items():
+                room = self.get(name)
+                room.load(data)
+                room.shift_clock(clock_shift(snapshot))
+        replayed = 0
+        for entry in self.journal.entries(snapshot["offset"] if snapshot else 0):
+            event, room = entry["event"], self.get(entry["room"])
+            shift_ns = clock_shift(entry)
+            if event["kind"] == "press":
+                event["press"]["server_ns"] += shift_ns
+                event["press"]["corrected_ns"] += shift_ns
+            elif event["kind"] == "save" and "number" in event:
+                # A room first seen in the log numbers its rounds from the
+                # history store, which may already hold the rounds saved here
+                room.round.number = event["number"]
+            number = room.round.number
+            try:
+                room.apply(event)
+            except Exception as e:
+                logger.error("Failed to replay %s event for %s: %r", event.get("kind"), entry["room"], e)
+            if room.round.number != number:
+                # Re-armed by a save, originally at the time it was logged
+                room.round.armed_ns = entry["ns"] + shift_ns
+            replayed += 1
+        # Nobody is connected yet, start() gives restored users the usual
+        # grace period to resume before they're dropped
+        if snapshot is not None or replayed:
+            logger.info("Restored %d rooms from %s, replayed %d events", len(self.rooms), self.journal.path, replayed)
+        return replayed
+
+    def start(self):
+        # On every start of the server, after the backend has caught up.
+        # With a shared backend other workers look after their own members.
+        prefix = f"{WORKER_ID}-"
+        for room in self.rooms.values():
+            room.start_timers(lambda conn_id: not self.backend.shared or conn_id.startswith(prefix))
+
+    def stop(self):
+        for room in self.rooms.values():
+            room.stop_timers()
+
+    async def reap_loop(self, interval, timeout):
+        # Heartbeat check for every room, then a presence report so hosts
+        # see fresh RTTs at the same pace
+        while True:
+            await asyncio.sleep(interval)
+            for room in list(self.rooms.values()):
+                room.reap(timeout)
+                room.report_presence()
+
+    def evict_idle(self):
+        # Local to this worker, evictions aren't shared through the backend.
+        # Rooms are only idle with no members on any worker, and one that
+        # comes back numbers its rounds from the event log or the store.
+        idle = [name for name, room in self.rooms.items()
+                if name not in self.pinned and room.is_idle(self.ttl)]
+        for name in idle:
+            del self.rooms[name]
+            logger.info("Room %s evicted after %.0fs idle", name, self.ttl)
+        return idle
+
+    async def evict_loop(self, interval=None):
+        while True:
+            await asyncio.sleep(interval or max(1.0, self.ttl / 4))
+            self.evict_idle()
+
+    def info(self):
+        return [room.info() for room in self.rooms.values()]
@@ -0,0 +1,97 @@
+from app.clock import now_ns
+
+# A round starts armed, locks once it has accepted its limit of presses and
+# is saved when the host moves it to history, after which a new one is armed
+ARMED = "armed"
+LOCKED = "locked"
+SAVED = "saved"
+
+
+class Round:
+    def __init__(self, accept_limit=None, debounce=True, number=1):
+        self.accept_limit = accept_limit or None  # None or 0 accepts every press
+        self.debounce = debounce  # Only the first press per user counts
+        self.number = number
+        self.state = ARMED
+        self.armed_ns = now_ns()
+        self.presses: list[dict] = []
+        self.pressed: set[str] = set()
+        self.rejected = 0
+
+    def accepts(self, user):
+        # Cheap check done before a press is even built
+        if self.state != ARMED:
+            return False
+        return not (self.debounce and user in self.pressed)
+
+    def add(self, press):
+        if not self.accepts(press["user"]):
+            self.rejected += 1
+            return False
+        self.presses.append(press)
+        self.pressed.add(press["user"])
+        self.check_limit()
+        return True
+
+    def configure(self, accept_limit=None, debounce=None):
+        if accept_limit is not None:
+            self.accept_limit = accept_limit or None
+        if debounce is not None:
+            self.debounce = debounce
+        if self.state == LOCKED and not self.is_full():
+            self.state = ARMED
+        self.check_limit()
+
+    def is_full(self):
+        return self.accept_limit is not None and len(self.presses) >= self.accept_limit
+
+    def check_limit(self):
+        if self.state == ARMED and self.is_full():
+            self.state = LOCKED
+
+    def save(self):
+        self.state = SAVED
+        return list(self.presses)
+
+    def rearm(self):
+        # Presses are cleared in place, the list is shared with whoever holds it
+        self.number += 1
+        self.state = ARMED
+        self.armed_ns = now_ns()
+        self.presses.clear()
+        self.pressed.clear()
+        self.rejected = 0
+
+    def dump(self):
+        # Everything needed to pick the round up again, see load
+        return {
+            "number": self.number,
+            "state": self.state,
+            "accept_limit": self.accept_limit,
+            "debounce": self.debounce,
+            "armed_ns": self.armed_ns,
+            "presses": self.presses,
+            "rejected": self.rejected,
+        }
+
+    def load(self, data):
+        self.number = data["number"]
+        self.state = data["state"]
+        self.accept_limit = data["accept_limit"]
+        self.debounce = data["debounce"]
+        self.armed_ns = data["armed_ns"]
+        # In place, like rearm
+        self.presses[:] = data["presses"]
+        self.pressed = {press["user"] for press in self.presses}
+        self.rejected = data["rejected"]
+
+    def info(self):
+        return {
+            "number": self.number,
+            "state": self.state,
+            "accept_limit": self.accept_limit,
+            "debounce": self.debounce,
+            "armed_ns": self.armed_ns,
+            "presses": len(self.presses),
+            "rejected": self.rejected,
+        }
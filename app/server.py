@@ -1,76 +1,387 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from app.analytics import Analytics
+from app.backend import WORKER_ID, create_backend
+from app.clock import now_ns
+from app.history import HistoryStore
+from app.journal import Journal
+from app.rooms import DEFAULT_ROOM, RoomRegistry
+from app import guard
+from app import metrics
+from app import protocol
+import asyncio
+import logging
+import os
+import threading
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-latest_presses: list[str] = []
-press_history: list[list[str]] = []
+# Outbound queue settings, see app.broadcast for the available policies
+SEND_QUEUE_SIZE = int(os.environ.get("PARTY_SEND_QUEUE_SIZE", 64))
+SLOW_CLIENT_POLICY = os.environ.get("PARTY_SLOW_CLIENT_POLICY", "coalesce")
+SEND_TIMEOUT = float(os.environ.get("PARTY_SEND_TIMEOUT", 5.0))
 
-connected_websockets: set[WebSocket] = set()
-user_connections: dict[WebSocket, str] = {}
+# Clock sync pings, a quick burst right after connecting then a slow trickle.
+# They double as the heartbeat: a connection that sends nothing, not even a
+# pong, for PARTY_HEARTBEAT_TIMEOUT seconds is reaped.
+PING_BURST = 5
+PING_BURST_INTERVAL = 0.2
+PING_INTERVAL = float(os.environ.get("PARTY_PING_INTERVAL", 5.0))
+HEARTBEAT_TIMEOUT = float(os.environ.get("PARTY_HEARTBEAT_TIMEOUT", 3 * PING_INTERVAL))
+
+# Round lock-out, 0 accepts every press. With debounce only a user's first
+# press in a round counts.
+ACCEPT_LIMIT = int(os.environ.get("PARTY_ACCEPT_LIMIT", 0))
+DEBOUNCE = os.environ.get("PARTY_DEBOUNCE", "1") != "0"
+
+# Dropped users keep their place for this long, reconnecting with their
+# resume token picks up where they left off. Missed events are replayed from
+# the last PARTY_REPLAY_EVENTS of the room, older gaps get a snapshot.
+RESUME_GRACE = float(os.environ.get("PARTY_RESUME_GRACE", 30))
+REPLAY_EVENTS = int(os.environ.get("PARTY_REPLAY_EVENTS", 256))
+
+# Joins and leaves within this many seconds go out as one users delta
+PRESENCE_WINDOW = float(os.environ.get("PARTY_PRESENCE_WINDOW", 0.1))
+
+# Spectators on /spectate get the room's state at most this often, seconds
+SPECTATOR_INTERVAL = float(os.environ.get("PARTY_SPECTATOR_INTERVAL", 0.25))
+
+# Rooms without connections are dropped after this many seconds
+ROOM_TTL = float(os.environ.get("PARTY_ROOM_TTL", 600))
+
+# Saved rounds of every room, kept on disk
+HISTORY_DB = os.environ.get("PARTY_HISTORY_DB", "press_history.db")
+HISTORY_PAGE_SIZE = 50
+
+# Where room state lives: "memory" for a single process, "sqlite" to share it
+# between workers through an event log at PARTY_STATE_PATH
+BACKEND = os.environ.get("PARTY_BACKEND", "memory")
+STATE_PATH = os.environ.get("PARTY_STATE_PATH", "party_state.db")
+BACKEND_POLL = float(os.environ.get("PARTY_BACKEND_POLL", 0.005))
+
+# Every room event is appended to this log, with a snapshot of all rooms
+# every PARTY_SNAPSHOT_EVERY events, and rooms are restored from it on
+# start. Empty turns it off. Only for the memory backend, with several
+# workers each one would log the same events.
+JOURNAL = os.environ.get("PARTY_JOURNAL", "party_journal.jsonl")
+SNAPSHOT_EVERY = int(os.environ.get("PARTY_SNAPSHOT_EVERY", 1000))
+
+history_store = HistoryStore(HISTORY_DB)
+analytics = Analytics(history_store)
+backend = create_backend(BACKEND, STATE_PATH, BACKEND_POLL)
+journal = Journal(JOURNAL, SNAPSHOT_EVERY) if JOURNAL and BACKEND == "memory" else None
+
+rooms = RoomRegistry(
+    ROOM_TTL,
+    history_store,
+    backend,
+    journal,
+    accept_limit=ACCEPT_LIMIT,
+    debounce=DEBOUNCE,
+    queue_size=SEND_QUEUE_SIZE,
+    slow_client_policy=SLOW_CLIENT_POLICY,
+    send_timeout=SEND_TIMEOUT,
+    resume_grace=RESUME_GRACE,
+    replay_events=REPLAY_EVENTS,
+    presence_window=PRESENCE_WINDOW,
+    spectator_interval=SPECTATOR_INTERVAL,
+)
+
+# The default room backs the room-less routes and the host GUI
+default_room = rooms.get(DEFAULT_ROOM)
+current_round = default_room.round
+latest_presses = default_room.latest_presses
+user_connections = default_room.user_connections
+
+# Gauges over room state, only computed when metrics are read
+metrics.Gauge("party_rooms", "Rooms on this worker", lambda: len(rooms.rooms))
+metrics.Gauge("party_connections", "Open websocket connections", lambda: sum(len(room.broadcaster.clients) for room in rooms.rooms.values()))
+metrics.Gauge("party_spectators", "Open spectator connections", lambda: sum(len(room.spectators.clients) for room in rooms.rooms.values()))
+metrics.Gauge("party_users", "Registered users in all rooms, on every worker", lambda: sum(len(room.members) for room in rooms.rooms.values()))
+metrics.Gauge("party_round_state_bytes", "Approximate memory held by round state",
+              lambda: [({"room": room.name}, room.state_bytes()) for room in rooms.rooms.values()])
+metrics.CounterView("party_messages_rejected_total", "Messages dropped by the input checks",
+                    lambda: [({"reason": reason}, count) for reason, count in guard.rejected.items()])
+
+# Loop the server runs on, so the host GUI can call into it from its own thread
+server_loop = None
+server_ready = threading.Event()
+# The host GUI can stop and start the server in one process, rooms only need
+# restoring from the journal the first time
+restored = False
+
+@asynccontextmanager
+async def lifespan(app):
+    global server_loop, restored
+    server_loop = asyncio.get_running_loop()
+    if journal is not None:
+        if not restored:
+            rooms.restore()
+            restored = True
+        journal.open()
+    await backend.start()
+    rooms.start()
+    evictor = asyncio.create_task(rooms.evict_loop())
+    reaper = asyncio.create_task(rooms.reap_loop(PING_INTERVAL, HEARTBEAT_TIMEOUT))
+    lag_watcher = asyncio.create_task(metrics.watch_loop())
+    server_ready.set()
+    yield
+    server_ready.clear()
+    server_loop = None
+    evictor.cancel()
+    reaper.cancel()
+    lag_watcher.cancel()
+    rooms.stop()
+    await backend.stop()
+    if journal is not None:
+        # Next start has nothing to replay
+        journal.write_snapshot(rooms.dump())
+        journal.close()
+
+async def _call(fn, args):
+    return fn(*args)
+
+def submit_to_server(fn, *args):
+    # Runs fn on the server loop from any other thread, returns a
+    # concurrent.futures.Future with its result
+    if server_loop is None:
+        raise RuntimeError("Server is not running")
+    return asyncio.run_coroutine_threadsafe(_call(fn, args), server_loop)
+
+def subscribe(listener, room=DEFAULT_ROOM):
+    return submit_to_server(lambda: rooms.get(room).subscribe(listener))
+
+def unsubscribe(listener, room=DEFAULT_ROOM):
+    game = rooms.get(room, create=False)
+    if game is None:
+        return
+    if server_loop is None:
+        game.unsubscribe(listener)
+    else:
+        submit_to_server(game.unsubscribe, listener)
+
+app = FastAPI(lifespan=lifespan)
+
+def get_room(room):
+    existing = rooms.get(room, create=False)
+    if existing is None:
+        raise HTTPException(status_code=404, detail=f"Room {room} not found")
+    return existing
 
 @app.get("/")
 def read_root():
     return {"message": "FastAPI is running!"}
 
+# Endpoints that touch room state are async so they run on the server loop
+# rather than in the threadpool
+
+@app.get("/rooms")
+async def list_rooms():
+    return {"rooms": rooms.info()}
+
+@app.get("/stats/clients")
+async def client_stats():
+    return {"clients": [
+        {"room": room.name, "tier": tier, **stats}
+        for room in rooms.rooms.values()
+        for tier, broadcaster in (("player", room.broadcaster), ("spectator", room.spectators))
+        for stats in broadcaster.stats()
+    ]}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Prometheus text format, for this worker only
+    return PlainTextResponse(metrics.render(worker=WORKER_ID), media_type="text/plain; version=0.0.4")
+
+def metrics_summary():
+    # Headline numbers for the host's live panel, run on the server loop.
+    # Histograms come back as bucket counts so the panel can look at the
+    # last interval only.
+    return {
+        "connections": sum(len(room.broadcaster.clients) for room in rooms.rooms.values()),
+        "spectators": sum(len(room.spectators.clients) for room in rooms.rooms.values()),
+        "received": metrics.messages_received_text.value + metrics.messages_received_binary.value,
+        "sent": metrics.messages_sent_text.value + metrics.messages_sent_binary.value,
+        "broadcast": list(metrics.broadcast_seconds.counts),
+        "loop_lag": list(metrics.loop_lag_seconds.counts),
+        "round_state_bytes": sum(room.state_bytes() for room in rooms.rooms.values()),
+    }
+
+@app.get("/stats/rejected")
+async def rejected_stats():
+    # Messages dropped by the input checks on this worker, see app.guard
+    return {"worker": WORKER_ID, "total": sum(guard.rejected.values()), "rejected": dict(guard.rejected)}
+
+# Read-only channels, declared before the player routes they'd otherwise match.
+# "spectate" is reserved, the player routes and on_connect refuse it as a
+# room or user name, see protocol.RESERVED_NAMES.
+
+@app.websocket("/spectate")
+async def spectate_endpoint(websocket: WebSocket):
+    await spectate_room_endpoint(websocket, DEFAULT_ROOM)
+
+@app.websocket("/spectate/{room}")
+async def spectate_room_endpoint(websocket: WebSocket, room: str):
+    await websocket.accept()
+    game = rooms.get(room)
+    game.spectate(websocket)
+    checker = guard.Guard(actions=guard.SPECTATOR_ACTIONS)
+    close_code = None
+    # No clock sync needed, just the heartbeat
+    pinger = asyncio.create_task(game.ping_loop(websocket, 0, 0, PING_INTERVAL))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if not game.seen(websocket):
+                # Reaped
+                break
+            # Only pongs are read, anything else counts against the connection
+            try:
+                if message.get("bytes") is not None:
+                    checker.admit_binary(message["bytes"])
+                else:
+                    checker.admit_text(message["text"])
+            except guard.Rejected:
+                if checker.exhausted():
+                    logger.warning("Closing spectator in %s after %d messages", room, checker.strikes)
+                    close_code = 1008  # Policy violation
+                    break
+    finally:
+        pinger.cancel()
+        game.unspectate(websocket)
+        if close_code is not None:
+            await game.close_quietly(websocket, close_code)
+
 @app.websocket("/{user_name}")
 async def websocket_endpoint(websocket: WebSocket, user_name: str):
+    await room_websocket_endpoint(websocket, DEFAULT_ROOM, user_name)
+
+@app.websocket("/{room}/{user_name}")
+async def room_websocket_endpoint(websocket: WebSocket, room: str, user_name: str):
+    if room in protocol.RESERVED_NAMES or user_name in protocol.RESERVED_NAMES:
+        await websocket.close(1008)  # Policy violation
+        return
     await websocket.accept()
-    connected_websockets.add(websocket)
+    game = rooms.get(room)
+    game.connect(websocket, user_name)
+    checker = guard.Guard()
+    close_code = None
+    pinger = asyncio.create_task(game.ping_loop(websocket, PING_BURST, PING_BURST_INTERVAL, PING_INTERVAL))
     try:
         while True:
-            data = await websocket.receive_text()
-            json_data = json.loads(data)
-            action = json_data.get("action")
+            message = await websocket.receive()
+            received_ns = now_ns()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if not game.seen(websocket):
+                # Reaped or dropped as a slow client, the socket is being closed
+                break
+
+            try:
+                if message.get("bytes") is not None:
+                    # Binary frames skip JSON entirely
+                    metrics.messages_received_binary.inc()
+                    action, payload = checker.admit_binary(message["bytes"])
+                else:
+                    metrics.messages_received_text.inc()
+                    action, payload = checker.admit_text(message["text"])
+            except guard.Rejected as e:
+                logger.debug("Rejected message from %s in %s: %s", checker.name or user_name, room, e.reason)
+                if checker.exhausted():
+                    logger.warning("Closing %s in %s after %d rejected messages", checker.name or user_name, room, checker.strikes)
+                    close_code = 1008  # Policy violation
+                    break
+                continue
 
             if action == "on_connect":
-                # Register user connection
-                user_connections[websocket] = json_data["payload"]["name"]
-                print(f"{json_data['payload']['name']} connected")
-                await broadcast_connected_users()
+                # The name registered here is the connection's identity from now on
+                resume = payload.get("resume")
+                checker.bind(payload["name"])
+                game.register_user(websocket, payload["name"], binary=bool(payload.get("binary")),
+                                   resume=resume, last_seq=payload.get("last_seq"))
+                logger.info("%s %s to %s", payload["name"], "reconnected" if resume else "connected", room)
+            elif action == "snapshot_request":
+                game.send_snapshot(websocket)
+            elif action == "pong":
+                game.add_pong(websocket, payload["server_ns"], payload["client_ns"], received_ns)
             elif action == "button_press":
-                latest_presses.append(json_data['user'])
-                await broadcast_latest_presses()
-            else:
-                print(f"Unknown action: {action}")
+                game.add_press(websocket, checker.name, received_ns, payload.get("client_ns"))
     except WebSocketDisconnect:
-        print(f"WebSocket from {user_name} disconnected.")
-        connected_websockets.remove(websocket)
-        user_connections.pop(websocket, None)
-        await broadcast_connected_users()
-
-async def broadcast_latest_presses():
-    message = json.dumps({
-        "type": "update",
-        "latest_presses": latest_presses
-    })
-    await broadcast_to_all(message)
-
-async def broadcast_connected_users():
-    users = list(user_connections.values())
-    message = json.dumps({
-        "type": "users",
-        "connected_users": users
-    })
-    await broadcast_to_all(message)
-
-async def broadcast_to_all(message):
-    disconnected = set()
-    for ws in connected_websockets:
-        try:
-            await ws.send_text(message)
-        except Exception as e:
-            print(f"Error sending to websocket: {e}")
-            disconnected.add(ws)
-    connected_websockets.difference_update(disconnected)
-    for ws in disconnected:
-        user_connections.pop(ws, None)
+        logger.info("WebSocket from %s disconnected from %s.", user_name, room)
+    finally:
+        pinger.cancel()
+        game.disconnect(websocket)
+        if close_code is not None:
+            # After disconnect, so nothing else is sent on the closing socket
+            await game.close_quietly(websocket, close_code)
+
+@app.get("/presence")
+async def presence():
+    return room_presence_info(default_room)
+
+@app.get("/{room}/presence")
+async def room_presence(room: str):
+    return room_presence_info(get_room(room))
+
+def room_presence_info(game):
+    # last_seen is epoch seconds, as reported by the worker holding the socket
+    return {"room": game.name, "users": game.presence_info()}
+
+@app.get("/round")
+async def round_info():
+    return default_room.round_info()
+
+@app.get("/{room}/round")
+async def room_round_info(room: str):
+    return get_room(room).round_info()
+
+@app.post("/round/config")
+async def configure_round(accept_limit: int | None = None, debounce: bool | None = None):
+    return default_room.configure_round(accept_limit, debounce)
+
+@app.post("/{room}/round/config")
+async def configure_room_round(room: str, accept_limit: int | None = None, debounce: bool | None = None):
+    # Creates the room, so it can be set up before anyone joins
+    return rooms.get(room).configure_round(accept_limit, debounce)
+
+@app.get("/history")
+def history(after: int | None = None, before: int | None = None, since: float | None = None, limit: int = HISTORY_PAGE_SIZE,
+            player: str | None = None):
+    return room_history(DEFAULT_ROOM, after, before, since, limit, player)
+
+@app.get("/{room}/history")
+def room_history(room: str, after: int | None = None, before: int | None = None, since: float | None = None, limit: int = HISTORY_PAGE_SIZE,
+                 player: str | None = None):
+    # History outlives evicted rooms, so this reads the store directly.
+    # player= only pages through the rounds that player pressed in.
+    if since is not None:
+        rounds = history_store.since(room, since, limit)
+    else:
+        rounds = history_store.page(room, after, before, limit, player)
+    return {"room": room, "rounds": rounds}
+
+@app.get("/analytics")
+def default_room_analytics():
+    return analytics.leaderboard(DEFAULT_ROOM)
+
+@app.get("/{room}/analytics")
+def room_analytics(room: str):
+    # Like history, works for rooms that have been evicted
+    return analytics.leaderboard(room)
 
 @app.post("/save_to_history")
 async def save_to_history():
-    if latest_presses:
-        press_history.append(latest_presses.copy())
-        latest_presses.clear()
-        await broadcast_latest_presses()
-        return {"message": "Saved to history"}
-    return {"message": "Nothing to save"}
\ No newline at end of file
+    return save_room_round(default_room)
+
+@app.post("/{room}/save_to_history")
+async def save_room_to_history(room: str):
+    return save_room_round(get_room(room))
+
+def save_room_round(game):
+    winner = game.save_round()
+    if winner is not None:
+        return {"message": "Saved to history", "winner": winner}
+    return {"message": "Nothing to save"}
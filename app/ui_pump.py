@@ -0,0 +1,230 @@
+import queue
+import tkinter as tk
+import tkinter.font as tkfont
+
+SET_LINES = "set_lines"
+APPEND_LINES = "append_lines"
+TRIM = "trim"
+PREPEND_LINES = "prepend_lines"
+CALL = "call"
+
+
+class LineView:
+    # Keeps a copy of what a textbox shows so an update only has to touch the
+    # lines that actually changed
+    def __init__(self, widget, autoscroll=False):
+        self.widget = widget
+        self.autoscroll = autoscroll
+        self.lines: list[str] = []
+
+    def set_lines(self, lines):
+        common = 0
+        for old, new in zip(self.lines, lines):
+            if old != new:
+                break
+            common += 1
+        if common < len(self.lines):
+            self.widget.delete(f"{common + 1}.0", tk.END)
+        self.lines = self.lines[:common]
+        self.append_lines(lines[common:])
+
+    def append_lines(self, lines):
+        if lines:
+            self.widget.insert(tk.END, "".join(line + "\n" for line in lines))
+            self.lines.extend(lines)
+
+    def trim(self, max_lines):
+        # Drops lines from the top so at most max_lines are left
+        extra = len(self.lines) - max_lines
+        if extra > 0:
+            self.widget.delete("1.0", f"{extra + 1}.0")
+            del self.lines[:extra]
+
+    def apply(self, ops):
+        self.widget.configure(state="normal")
+        for op, arg in ops:
+            if op == SET_LINES:
+                self.set_lines(arg)
+            elif op == APPEND_LINES:
+                self.append_lines(arg)
+            elif op == TRIM:
+                self.trim(arg)
+        if self.autoscroll:
+            self.widget.see(tk.END)
+        self.widget.configure(state="disabled")
+
+
+class VirtualView:
+    # For lists that can get long: keeps every line but only puts the ones in
+    # view into the widget, so an update costs the same however long the list
+    # is. Scrolling moves that window over the lines. The widget shouldn't
+    # wrap lines or scroll on its own, scrollbar is anything with a Tk style
+    # set(first, last) and should call yview.
+    def __init__(self, widget, scrollbar=None, autoscroll=False):
+        self.widget = widget
+        self.scrollbar = scrollbar
+        self.autoscroll = autoscroll
+        self.lines: list[str] = []
+        self.top = 0  # Index of the first line in view
+        self.rows = 1
+        self.following = True  # Whether to stay at the bottom with autoscroll
+        self.window = LineView(widget)
+        widget.bind("<Configure>", self.resize, add="+")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            widget.bind(sequence, self.on_wheel, add="+")
+
+    def set_lines(self, lines):
+        self.lines = list(lines)
+
+    def append_lines(self, lines):
+        self.lines.extend(lines)
+
+    def prepend_lines(self, lines):
+        # Keeps the same lines in view unless the view is at the top, then
+        # the new lines come into view
+        self.lines[:0] = lines
+        if self.top > 0:
+            self.top += len(lines)
+
+    def trim(self, max_lines):
+        extra = len(self.lines) - max_lines
+        if extra > 0:
+            del self.lines[:extra]
+            self.top = max(0, self.top - extra)
+
+    def last_top(self):
+        return max(0, len(self.lines) - self.rows)
+
+    def show(self):
+        # Puts the lines in view into the widget, the window view only
+        # touches the rows that differ from what's already there
+        if self.autoscroll and self.following:
+            self.top = self.last_top()
+        self.top = min(max(0, self.top), self.last_top())
+        self.window.set_lines(self.lines[self.top:self.top + self.rows])
+        if self.scrollbar is not None:
+            total = len(self.lines)
+            if total <= self.rows:
+                self.scrollbar.set(0.0, 1.0)
+            else:
+                self.scrollbar.set(self.top / total, (self.top + self.rows) / total)
+
+    def apply(self, ops):
+        for op, arg in ops:
+            if op == SET_LINES:
+                self.set_lines(arg)
+            elif op == APPEND_LINES:
+                self.append_lines(arg)
+            elif op == PREPEND_LINES:
+                self.prepend_lines(arg)
+            elif op == TRIM:
+                self.trim(arg)
+        self.redraw()
+
+    def redraw(self):
+        self.widget.configure(state="normal")
+        self.show()
+        self.widget.configure(state="disabled")
+
+    def scroll_to(self, top):
+        self.top = top
+        self.following = top >= self.last_top()
+        self.redraw()
+
+    def yview(self, *args):
+        # Scrollbar command, ("moveto", fraction) or ("scroll", n, what)
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self.lines)))
+        elif args[0] == "scroll":
+            step = self.rows if args[2] == "pages" else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+        return "break"
+
+    def resize(self, event=None):
+        font = self.widget.cget("font")
+        if isinstance(font, tkfont.Font):
+            line_height = font.metrics("linespace")
+        else:
+            line_height = tkfont.Font(root=self.widget, font=font).metrics("linespace")
+        rows = max(1, self.widget.winfo_height() // max(1, line_height))
+        if rows != self.rows:
+            self.rows = rows
+            self.redraw()
+
+
+class UIPump:
+    # The only place widgets get touched from. Any thread may queue updates,
+    # the Tk main loop drains them at most `fps` times a second and merges
+    # everything queued for the same view into one pass over the widget.
+    def __init__(self, master, fps=60):
+        self.master = master
+        self.interval = max(1, int(1000 / fps))
+        self.queue = queue.SimpleQueue()
+        self.running = False
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.master.after(self.interval, self.drain)
+
+    def stop(self):
+        self.running = False
+
+    def set_lines(self, view, lines):
+        self.queue.put((view, SET_LINES, list(lines)))
+
+    def append_lines(self, view, lines):
+        self.queue.put((view, APPEND_LINES, list(lines)))
+
+    def append_line(self, view, line):
+        self.queue.put((view, APPEND_LINES, [line]))
+
+    def trim(self, view, max_lines):
+        self.queue.put((view, TRIM, max_lines))
+
+    def prepend_lines(self, view, lines):
+        self.queue.put((view, PREPEND_LINES, list(lines)))
+
+    def call(self, callback):
+        self.queue.put((None, CALL, callback))
+
+    def collect(self):
+        views: dict[LineView, list] = {}
+        calls = []
+        while True:
+            try:
+                view, op, arg = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if op == CALL:
+                calls.append(arg)
+                continue
+            ops = views.setdefault(view, [])
+            if op == SET_LINES:
+                # A full redraw makes everything queued before it moot
+                ops[:] = [(SET_LINES, arg)]
+            elif op == APPEND_LINES and ops and ops[-1][0] in (SET_LINES, APPEND_LINES):
+                ops[-1] = (ops[-1][0], ops[-1][1] + arg)
+            else:
+                ops.append((op, arg))
+        return views, calls
+
+    def drain(self):
+        if not self.running:
+            return
+        try:
+            views, calls = self.collect()
+            for view, ops in views.items():
+                view.apply(ops)
+            for callback in calls:
+                callback()
+        except Exception as e:
+            print(f"App:\tUI update failed: {e!r}")
+        finally:
+            self.master.after(self.interval, self.drain)
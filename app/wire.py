@@ -0,0 +1,125 @@
+import struct
+from app import protocol
+
+# Optional binary framing for the hot path, negotiated with "binary": true in
+# the on_connect payload. Users are referred to by small integer IDs sent
+# once in a JSON "user_ids" message. Everything that isn't a press, a ping
+# or a pong stays JSON, and clients that never ask for binary only see JSON.
+WELCOME = "welcome"
+USER_IDS = "user_ids"
+
+# Client to server
+PRESS = 0x01
+PONG = 0x02
+
+# Server to client
+PING = 0x81
+PRESS_APPENDED = 0x82
+ROUND_RESET = 0x83
+
+NONE = -1  # Stand-in for a missing optional timestamp
+NO_USER = 0xFFFF
+
+STATES = ["armed", "locked", "saved"]
+NO_STATE = 0xFF
+
+PRESS_FRAME = struct.Struct("<Bq")
+PONG_FRAME = struct.Struct("<Bqq")
+PING_FRAME = struct.Struct("<Bq")
+PRESS_APPENDED_FRAME = struct.Struct("<BIHHBqqqq")
+ROUND_RESET_FRAME = struct.Struct("<BIB")
+
+
+def welcome_message(user_id, binary, resume=None, resumed=False):
+    # resume is the token to send back in on_connect after a reconnect,
+    # resumed says whether this connection took over an earlier session
+    return {"type": WELCOME, "binary": binary, "user_id": user_id, "resume": resume, "resumed": resumed}
+
+
+def user_ids_message(ids):
+    return {"type": USER_IDS, "ids": ids}
+
+
+def encode_press(client_ns):
+    return PRESS_FRAME.pack(PRESS, client_ns)
+
+
+def encode_pong(server_ns, client_ns):
+    return PONG_FRAME.pack(PONG, server_ns, client_ns)
+
+
+def encode_ping(server_ns):
+    return PING_FRAME.pack(PING, server_ns)
+
+
+def decode_client(frame):
+    # Returns (action, payload) in the same shape as the JSON messages
+    op = frame[0]
+    if op == PRESS:
+        _, client_ns = PRESS_FRAME.unpack(frame)
+        return "button_press", {"client_ns": client_ns}
+    if op == PONG:
+        _, server_ns, client_ns = PONG_FRAME.unpack(frame)
+        return "pong", {"server_ns": server_ns, "client_ns": client_ns}
+    raise ValueError(f"Unknown binary frame {op:#x}")
+
+
+def encode_state(state):
+    return STATES.index(state) if state in STATES else NO_STATE
+
+
+def decode_state(value):
+    return STATES[value] if value < len(STATES) else None
+
+
+def optional(value):
+    return NONE if value is None else value
+
+
+def encode_event(event, user_ids):
+    # Binary form of a room event, or None if it only exists as JSON
+    kind = event["type"]
+    if kind == protocol.PRESS_APPENDED:
+        press = event["press"]
+        if press["user"] not in user_ids:
+            # Past the last ID a room hands out, only JSON can name them
+            return None
+        return PRESS_APPENDED_FRAME.pack(
+            PRESS_APPENDED,
+            event["seq"],
+            user_ids[press["user"]],
+            user_ids.get(event["winner"], NO_USER),
+            encode_state(event["state"]),
+            press["server_ns"],
+            press["corrected_ns"],
+            optional(press["client_ns"]),
+            optional(press["rtt_ns"]),
+        )
+    if kind == protocol.ROUND_RESET:
+        return ROUND_RESET_FRAME.pack(ROUND_RESET, event["seq"], encode_state(event["state"]))
+    return None
+
+
+def decode_event(frame, user_names):
+    # Inverse of encode_event plus pings, user_names maps IDs back to names.
+    # Returns None when the frame names a user we don't know yet.
+    op = frame[0]
+    if op == PING:
+        _, server_ns = PING_FRAME.unpack(frame)
+        return {"type": protocol.PING, "server_ns": server_ns}
+    if op == PRESS_APPENDED:
+        _, seq, user_id, winner_id, state, server_ns, corrected_ns, client_ns, rtt_ns = PRESS_APPENDED_FRAME.unpack(frame)
+        if user_id not in user_names:
+            return None
+        press = protocol.make_press(
+            user_names[user_id],
+            server_ns,
+            corrected_ns,
+            None if client_ns == NONE else client_ns,
+            None if rtt_ns == NONE else rtt_ns,
+        )
+        return protocol.press_appended(seq, press, user_names.get(winner_id), decode_state(state))
+    if op == ROUND_RESET:
+        _, seq, state = ROUND_RESET_FRAME.unpack(frame)
+        return protocol.round_reset(seq, decode_state(state))
+    raise ValueError(f"Unknown binary frame {op:#x}")
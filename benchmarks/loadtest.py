@@ -0,0 +1,354 @@
+"""Load test for the press/broadcast path.
+
+Starts the server (or uses --url), connects N simulated guests, drives presses
+and reports press-to-broadcast latency, throughput and server CPU/memory as
+JSON, so runs can be compared between versions:
+
+    python benchmarks/loadtest.py --guests 50 --duration 20 --pattern burst
+    python benchmarks/loadtest.py --guests 100 --rate 2 --binary -o run.json
+
+Needs the `websockets` package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import protocol, wire
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1e6
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) / 1e6,
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "p999": pick(0.999),
+        "max": ordered[-1] / 1e6,
+    }
+
+
+class ProcessSampler:
+    # CPU time and resident memory of the server process, via psutil when it's
+    # installed and /proc otherwise
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_rss = 0
+        try:
+            import psutil
+            self.process = psutil.Process(pid)
+        except Exception:
+            self.process = None
+
+    def cpu_seconds(self):
+        if self.process:
+            times = self.process.cpu_times()
+            return times.user + times.system
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def rss_bytes(self):
+        if self.process:
+            rss = self.process.memory_info().rss
+        else:
+            try:
+                with open(f"/proc/{self.pid}/status") as f:
+                    rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+            except (OSError, StopIteration):
+                return None
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    async def sample(self, interval=0.5):
+        while True:
+            self.rss_bytes()
+            await asyncio.sleep(interval)
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.latencies: list[int] = []
+        # Pressing window shared by every guest, drain time isn't part of it
+        self.stop_at = None
+        self.pressing_ended = None
+
+
+def http(base_url, method, path, params=None):
+    query = "?" + "&".join(f"{k}={v}" for k, v in params.items()) if params else ""
+    request = urllib.request.Request(base_url + path + query, method=method)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_for_server(base_url, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            http(base_url, "GET", "/")
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+async def read_loop(ws, stats, binary, measure):
+    names: dict[int, str] = {}
+    async for message in ws:
+        received_ns = time.monotonic_ns()
+        stats.messages += 1
+        stats.bytes += len(message)
+        if isinstance(message, bytes):
+            data = wire.decode_event(message, names)
+            if data is None:
+                continue
+        else:
+            data = json.loads(message)
+
+        kind = data.get("type")
+        if kind == protocol.PRESS_APPENDED:
+            stats.received += 1
+            client_ns = data["press"].get("client_ns")
+            if measure and client_ns is not None:
+                stats.latencies.append(received_ns - client_ns)
+        elif kind == protocol.PING:
+            if binary:
+                await ws.send(wire.encode_pong(data["server_ns"], time.monotonic_ns()))
+            else:
+                await ws.send(protocol.pong_message("", data["server_ns"]))
+        elif kind == wire.USER_IDS:
+            names.update({user_id: name for name, user_id in data["ids"].items()})
+
+
+async def send_press(ws, name, binary, stats):
+    client_ns = time.monotonic_ns()
+    if binary:
+        await ws.send(wire.encode_press(client_ns))
+    else:
+        await ws.send(protocol.press_message(name, client_ns))
+    stats.sent += 1
+
+
+async def guest(index, args, ws_url, stats, started):
+    name = f"guest{index}"
+    async with websockets.connect(f"{ws_url}/{args.room}/{name}", max_queue=None, ping_interval=None) as ws:
+        payload = {"name": name, "binary": args.binary}
+        await ws.send(json.dumps({"user": name, "action": "on_connect", "payload": payload}))
+        # Only a sample of guests measure latency, every guest still reads
+        reader = asyncio.create_task(read_loop(ws, stats, args.binary, index < args.observers))
+        await started.wait()
+        stop_at = stats.stop_at
+        try:
+            if args.pattern == "steady":
+                while True:
+                    # The last wait is cut short at the end of the window
+                    await asyncio.sleep(min(random.expovariate(args.rate), max(0.0, stop_at - time.monotonic())))
+                    if time.monotonic() >= stop_at:
+                        break
+                    await send_press(ws, name, args.binary, stats)
+            else:
+                while time.monotonic() < stop_at:
+                    for _ in range(args.burst_size):
+                        await send_press(ws, name, args.binary, stats)
+                    await asyncio.sleep(min(args.burst_interval, max(0.0, stop_at - time.monotonic())))
+            stats.pressing_ended = max(stats.pressing_ended or 0.0, time.monotonic())
+            await asyncio.sleep(args.drain)
+        except websockets.ConnectionClosed:
+            stats.errors += 1
+        reader.cancel()
+
+
+async def saver(base_url, args, stop_at):
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(args.save_every)
+        await asyncio.to_thread(http, base_url, "POST", f"/{args.room}/save_to_history")
+
+
+async def client_counters(base_url, args, stop_at):
+    # Per-client counters only exist while the guests are connected, so they
+    # are read halfway through the drain rather than after it
+    await asyncio.sleep(max(0.0, stop_at + args.drain / 2 - time.monotonic()))
+    clients = (await asyncio.to_thread(http, base_url, "GET", "/stats/clients"))["clients"]
+    counters = {}
+    for client in clients:
+        if client["room"] != args.room:
+            continue
+        tier = counters.setdefault(client["tier"], {"clients": 0, "sent": 0, "dropped": 0, "coalesced": 0, "closed": 0})
+        tier["clients"] += 1
+        for key in ("sent", "dropped", "coalesced"):
+            tier[key] += client[key]
+        tier["closed"] += bool(client["closed"])
+    return counters
+
+
+async def run(args, base_url, sampler):
+    ws_url = base_url.replace("http://", "ws://", 1)
+    # Every press has to count, so no lock-out and no debounce
+    await asyncio.to_thread(http, base_url, "POST", f"/{args.room}/round/config", {"accept_limit": 0, "debounce": "false"})
+
+    stats = Stats()
+    started = asyncio.Event()
+    guests = []
+    for i in range(args.guests):
+        guests.append(asyncio.create_task(guest(i, args, ws_url, stats, started)))
+        await asyncio.sleep(args.ramp / max(1, args.guests))
+
+    sampling = asyncio.create_task(sampler.sample()) if sampler else None
+    cpu_before = sampler.cpu_seconds() if sampler else None
+    begin = time.monotonic()
+    stop_at = stats.stop_at = begin + args.duration
+    started.set()
+    tasks = [asyncio.create_task(saver(base_url, args, stop_at))] if args.save_every else []
+    counting = asyncio.create_task(client_counters(base_url, args, stop_at))
+    await asyncio.gather(*guests, return_exceptions=True)
+    elapsed = time.monotonic() - begin
+    # Presses are only counted over the window they were sent in
+    pressing = (stats.pressing_ended or time.monotonic()) - begin
+    for task in tasks + ([sampling] if sampling else []):
+        task.cancel()
+    # Presses the server turned away never come back as broadcasts, e.g. the
+    # rate limit of a server started without the benchmark
+    rejected = await asyncio.to_thread(http, base_url, "GET", "/stats/rejected")
+    clients = await counting
+
+    server = None
+    if sampler:
+        cpu_after = sampler.cpu_seconds()
+        cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+        server = {
+            "cpu_seconds": cpu,
+            "cpu_percent": 100 * cpu / elapsed if cpu is not None else None,
+            "rss_mb": (sampler.rss_bytes() or 0) / 2 ** 20,
+            "peak_rss_mb": sampler.peak_rss / 2 ** 20,
+        }
+
+    # Every press goes out to every guest, the presser included
+    expected = stats.sent * args.guests
+    return {
+        "elapsed_seconds": elapsed,
+        "pressing_seconds": pressing,
+        "drain_seconds": elapsed - pressing,
+        "presses_sent": stats.sent,
+        "press_broadcasts_expected": expected,
+        "press_broadcasts_received": stats.received,
+        "delivery_ratio": stats.received / expected if expected else None,
+        "messages_received": stats.messages,
+        "bytes_received": stats.bytes,
+        "errors": stats.errors,
+        "rejected_messages": rejected["total"],
+        "presses_per_second": stats.sent / pressing,
+        "messages_per_second": stats.messages / elapsed,
+        "latency_ms": percentiles(stats.latencies),
+        # Queue counters by tier, what the slow client policy dropped or coalesced
+        "clients": clients,
+        "server": server,
+    }
+
+
+def start_server(port):
+    # Fresh state every run, nothing read from or left on disk. Guests press
+    # faster than a person would, so the per-connection rate limit is off.
+    env = dict(os.environ, PARTY_HISTORY_DB=":memory:", PARTY_JOURNAL="", PARTY_RATE_LIMIT="0")
+    command = [sys.executable, "-m", "uvicorn", "app.server:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(command, cwd=root, env=env)
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the press/broadcast path")
+    parser.add_argument("--url", help="Existing server, e.g. http://127.0.0.1:6969 (default: start one)")
+    parser.add_argument("--server-pid", type=int, help="PID to sample CPU/memory from when using --url")
+    parser.add_argument("--port", type=int, default=6979, help="Port for the server started by the benchmark")
+    parser.add_argument("--room", default="loadtest")
+    parser.add_argument("--guests", type=int, default=50)
+    parser.add_argument("--observers", type=int, default=10, help="Guests that record latency samples")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of pressing")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds to spread connects over")
+    parser.add_argument("--drain", type=float, default=1.0, help="Seconds to keep reading after the last press")
+    parser.add_argument("--pattern", choices=("steady", "burst"), default="steady")
+    parser.add_argument("--rate", type=float, default=1.0, help="Presses per second per guest (steady)")
+    parser.add_argument("--burst-size", type=int, default=1, help="Presses per guest per burst")
+    parser.add_argument("--burst-interval", type=float, default=1.0, help="Seconds between bursts")
+    parser.add_argument("--save-every", type=float, default=0, help="Save the round every N seconds (0 = never)")
+    parser.add_argument("--binary", action="store_true", help="Use binary framing")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if websockets is None:
+        parser.error("the websockets package is required: pip install websockets")
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        pid = args.server_pid
+    else:
+        process = start_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+        pid = process.pid
+
+    try:
+        if not wait_for_server(base_url):
+            parser.error(f"server at {base_url} did not come up")
+        sampler = ProcessSampler(pid) if pid else None
+        results = asyncio.run(run(args, base_url, sampler))
+    finally:
+        if process:
+            process.terminate()
+            process.wait(10)
+
+    report = {
+        "version": git_version(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Offline replay of a server journal, for audits and for benchmarking.
+
+Feeds every event of a journal (see app/journal.py) through a fresh room
+registry in the original order, with the original gaps between events divided
+by --speed, or back to back with --speed 0. Every saved round is printed with
+its presses in arbitration order, so "who really pressed first" can be checked
+against what the server decided. Ends with a JSON report of event counts and
+how long applying them took:
+
+    python benchmarks/replay.py party_journal.jsonl --speed 20
+    python benchmarks/replay.py party_journal.jsonl --speed 0 --quiet -o replay.json
+
+Nothing is written anywhere, saved rounds go to an in-memory history store.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import journal, protocol
+from app.backend import MemoryBackend
+from app.history import HistoryStore
+from app.rooms import RoomRegistry
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1e3
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) / 1e3,
+        "p50": pick(0.50),
+        "p99": pick(0.99),
+        "max": ordered[-1] / 1e3,
+    }
+
+
+def format_saved_round(room, entry):
+    presses = protocol.format_presses(room.latest_presses, latency=True)
+    saved_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["t"]))
+    return (f"{saved_at}  {entry['room']} round {room.round.number}: "
+            f"winner {protocol.round_winner(room.latest_presses)}  {', '.join(presses)}")
+
+
+async def replay(args):
+    # No grace periods or batching windows, every event takes effect at once
+    registry = RoomRegistry(float("inf"), HistoryStore(), MemoryBackend(), resume_grace=0, presence_window=0)
+    kinds = Counter()
+    apply_ns = []  # Per event, microseconds once reported
+    first_t = last_t = None
+    started = time.perf_counter()
+    for entry in journal.read(args.journal):
+        if args.room and entry["room"] != args.room:
+            continue
+        if first_t is None:
+            first_t = entry["t"]
+        last_t = entry["t"]
+        if args.speed > 0:
+            delay = (entry["t"] - first_t) / args.speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        room = registry.get(entry["room"])
+        event = entry["event"]
+        if event["kind"] == "press":
+            # Server timestamps onto the wall clock, so presses logged by
+            # different runs of the server still compare
+            shift_ns = int(entry["t"] * 1e9) - entry["ns"]
+            event["press"]["server_ns"] += shift_ns
+            event["press"]["corrected_ns"] += shift_ns
+        elif event["kind"] == "save":
+            if "number" in event:
+                room.round.number = event["number"]
+            if room.latest_presses and not args.quiet:
+                print(format_saved_round(room, entry))
+        start = time.perf_counter_ns()
+        room.apply(event)
+        apply_ns.append(time.perf_counter_ns() - start)
+        kinds[event["kind"]] += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "events": sum(kinds.values()),
+        "kinds": dict(kinds),
+        "session_seconds": None if first_t is None else last_t - first_t,
+        "elapsed_seconds": elapsed,
+        "events_per_second": sum(kinds.values()) / elapsed if elapsed else None,
+        "apply_us": percentiles(apply_ns),
+        "rooms": {name: room.round_info() for name, room in registry.rooms.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a server journal offline")
+    parser.add_argument("journal", help="Journal file, e.g. party_journal.jsonl")
+    parser.add_argument("--speed", type=float, default=10.0, help="Playback speed, 0 for as fast as possible")
+    parser.add_argument("--room", help="Only replay this room")
+    parser.add_argument("--quiet", action="store_true", help="Don't print saved rounds")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.journal):
+        parser.error(f"no journal at {args.journal}")
+
+    results = asyncio.run(replay(args))
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
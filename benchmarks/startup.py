@@ -0,0 +1,163 @@
+"""Cold start benchmark for the GUI and the server.
+
+Every sample runs in a fresh interpreter, so module caches from earlier samples
+don't count. Reports the median import time of each entry point, which heavy
+modules importing the GUI pulls in, and optionally the time until the main
+window is up, as JSON:
+
+    python benchmarks/startup.py --repeat 10
+    python benchmarks/startup.py --window --top 15 -o startup.json
+
+--window needs customtkinter and a display.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points worth timing on their own
+TARGETS = {
+    "gui": "app.gui",
+    "server": "app.server",
+    "guest_protocol": "app.wire",
+}
+
+# Modules a guest should never have to load
+HEAVY = ("fastapi", "starlette", "uvicorn", "pydantic", "websocket", "keyboard", "app.server", "sqlite3")
+
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+WINDOW_SCRIPT = """
+import time, json
+start = time.perf_counter()
+from app.gui import App
+imported = time.perf_counter()
+app = App()
+app.update()
+shown = time.perf_counter()
+app.destroy()
+print(json.dumps({"import_seconds": imported - start, "window_seconds": shown - start}))
+"""
+
+
+def run_python(code, *flags):
+    env = dict(os.environ, PARTY_HISTORY_DB=":memory:")
+    result = subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result
+
+
+def last_json(result):
+    # The app may print while importing, the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def interpreter_seconds(repeat):
+    # Baseline cost of starting Python at all
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python("pass")
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def time_import(module, repeat):
+    samples = []
+    loaded = []
+    for _ in range(repeat):
+        result = last_json(run_python(IMPORT_SCRIPT.format(module=module, heavy=HEAVY)))
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def slowest_imports(module, top):
+    # Parsed from -X importtime, cumulative microseconds per module
+    stderr = run_python(f"import {module}", "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": us / 1000} for us, name in rows[:top]]
+
+
+def time_window(repeat):
+    samples = [last_json(run_python(WINDOW_SCRIPT)) for _ in range(repeat)]
+    return {
+        "import_ms": statistics.median(s["import_seconds"] for s in samples) * 1000,
+        "window_ms": statistics.median(s["window_seconds"] for s in samples) * 1000,
+    }
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and startup time")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--window", action="store_true", help="Also time App() until the window is drawn")
+    parser.add_argument("--top", type=int, default=0, help="List the N slowest imports of each target")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = {"interpreter_ms": interpreter_seconds(args.repeat) * 1000, "imports": {}}
+    for name, module in TARGETS.items():
+        try:
+            results["imports"][name] = time_import(module, args.repeat)
+            if args.top:
+                results["imports"][name]["slowest"] = slowest_imports(module, args.top)
+        except RuntimeError as e:
+            # Usually a missing optional dependency, e.g. no customtkinter
+            results["imports"][name] = {"error": str(e)}
+
+    if args.window:
+        try:
+            results["window"] = time_window(args.repeat)
+        except RuntimeError as e:
+            results["window"] = {"error": str(e)}
+
+    report = {
+        "version": git_version(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
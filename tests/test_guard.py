@@ -0,0 +1,66 @@
+import json
+import pytest
+from app import guard, wire
+
+
+def message(action, **payload):
+    return json.dumps({"action": action, "payload": payload})
+
+
+def registered():
+    checker = guard.Guard(rate=0)
+    checker.admit_text(message("on_connect", name="alice"))
+    checker.bind("alice")
+    return checker
+
+
+def test_accepts_valid_messages():
+    checker = registered()
+    assert checker.admit_text(message("button_press", client_ns=123)) == ("button_press", {"client_ns": 123})
+    assert checker.admit_binary(wire.encode_pong(1, 2)) == ("pong", {"server_ns": 1, "client_ns": 2})
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("{", "bad_json"),
+    ("[" * 2000, "bad_json"),
+    ("[]", "bad_schema"),
+    (message("teleport"), "unknown_action"),
+    (message("button_press", client_ns="soon"), "bad_schema"),
+    (message("button_press", client_ns=True), "bad_schema"),
+    (message("button_press", client_ns=10 ** 30), "bad_schema"),
+    (message("button_press", client_ns=-2 ** 63 - 1), "bad_schema"),
+    (message("pong", server_ns=2 ** 63, client_ns=0), "bad_schema"),
+    (message("on_connect", name="bob"), "already_registered"),
+])
+def test_rejects_bad_messages(text, reason):
+    checker = registered()
+    with pytest.raises(guard.Rejected) as rejected:
+        checker.admit_text(text)
+    assert rejected.value.reason == reason
+
+
+def test_unregistered_connection_cannot_press():
+    with pytest.raises(guard.Rejected) as rejected:
+        guard.Guard(rate=0).admit_text(message("button_press"))
+    assert rejected.value.reason == "not_registered"
+
+
+def test_bounds_fit_binary_frames():
+    checker = registered()
+    for client_ns in (guard.INT_MIN, guard.INT_MAX):
+        action, payload = checker.admit_text(message("button_press", client_ns=client_ns))
+        assert wire.decode_client(wire.encode_press(payload["client_ns"])) == (action, payload)
+
+
+@pytest.mark.parametrize("frame", [
+    message("button_press", client_ns=1),
+    message("snapshot_request"),
+    message("on_connect", name="alice"),
+    wire.encode_press(1),
+])
+def test_spectators_are_read_only(frame):
+    checker = guard.Guard(rate=0, actions=guard.SPECTATOR_ACTIONS)
+    with pytest.raises(guard.Rejected) as rejected:
+        checker.admit_binary(frame) if isinstance(frame, bytes) else checker.admit_text(frame)
+    assert rejected.value.reason == "read_only"
+    assert checker.admit_binary(wire.encode_pong(1, 2))[0] == "pong"
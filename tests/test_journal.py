@@ -0,0 +1,101 @@
+import asyncio
+import json
+import pytest
+from app import protocol
+from app import rooms as rooms_module
+from app.backend import WORKER_ID, MemoryBackend
+from app.clock import now_ns
+from app.history import HistoryStore
+from app.journal import Journal
+from app.rooms import RoomRegistry
+
+
+def registry(path, store, snapshot_every=1000):
+    journal = Journal(str(path), snapshot_every)
+    return RoomRegistry(store=store, backend=MemoryBackend(), journal=journal, resume_grace=30, presence_window=0)
+
+
+def play(rooms):
+    # Two users, a saved round and a press in the next one
+    room = rooms.get("r1")
+    room.submit({"kind": "join", "conn": "c1", "name": "alice", "token": "t1"})
+    room.submit({"kind": "join", "conn": "c2", "name": "bob", "token": "t2"})
+    for user in ("bob", "alice"):
+        room.submit({"kind": "press", "press": protocol.make_press(user, now_ns(), now_ns())})
+    room.save_round()
+    room.submit({"kind": "press", "press": protocol.make_press("alice", now_ns(), now_ns())})
+    return room
+
+
+def state(room):
+    return {
+        "number": room.round.number,
+        "users": [press["user"] for press in room.latest_presses],
+        "press_seq": room.press_seq,
+        "members": dict(room.members),
+        "tokens": dict(room.tokens),
+        "user_ids": dict(room.user_ids),
+    }
+
+
+@pytest.fixture
+def new_process(monkeypatch):
+    # Restores happen in a new process, whose saves have another origin
+    def restart():
+        monkeypatch.setattr(rooms_module, "WORKER_ID", "restarted")
+    return restart
+
+
+def restored(path, store):
+    rooms = registry(path, store)
+    rooms.restore()
+    return rooms.get("r1")
+
+
+def run(fn):
+    async def main():
+        return fn()
+    return asyncio.run(main())
+
+
+def test_restore_replays_the_log(tmp_path, new_process):
+    path, store = tmp_path / "journal.jsonl", HistoryStore()
+    rooms = registry(path, store)
+    rooms.journal.open()
+    before = state(run(lambda: play(rooms)))
+    rooms.journal.close()
+    assert before["number"] == 2 and before["users"] == ["alice"]
+    new_process()
+    assert state(run(lambda: restored(path, store))) == before
+    # The saved round was written once, by the first run
+    assert [saved["number"] for saved in store.page("r1")] == [1]
+
+
+def test_restore_from_snapshot_and_tail(tmp_path, new_process):
+    path, store = tmp_path / "journal.jsonl", HistoryStore()
+    rooms = registry(path, store, snapshot_every=4)
+    rooms.journal.open()
+    before = state(run(lambda: play(rooms)))
+    rooms.journal.close()
+    snapshot = json.loads((tmp_path / "journal.jsonl.snapshot").read_text())
+    assert 0 < snapshot["offset"] < path.stat().st_size
+    new_process()
+    assert state(run(lambda: restored(path, store))) == before
+
+
+def test_line_cut_short_by_a_crash_is_skipped(tmp_path, new_process):
+    path, store = tmp_path / "journal.jsonl", HistoryStore()
+    rooms = registry(path, store)
+    rooms.journal.open()
+    before = state(run(lambda: play(rooms)))
+    rooms.journal.close()
+    with open(path, "a") as f:
+        f.write('{"t": 1, "ns": 1, "room": "r1", "event": {"kind": "pre')
+    new_process()
+    assert state(run(lambda: restored(path, store))) == before
+    # Reopening keeps the next line apart from the damaged one
+    journal = Journal(str(path))
+    journal.open()
+    journal.record("r1", {"kind": "save", "origin": WORKER_ID, "number": 2})
+    journal.close()
+    assert list(journal.entries())[-1]["event"]["kind"] == "save"
@@ -0,0 +1,141 @@
+import asyncio
+import json
+from app import protocol, wire
+from app.backend import MemoryBackend
+from app.rooms import Room
+from tests.test_wire import FakeSocket
+
+
+def make_room(**settings):
+    backend = MemoryBackend()
+    room = Room("test", backend=backend, **{"resume_grace": 0, "presence_window": 0, **settings})
+    backend.dispatch = lambda name, event: room.apply(event)
+    return room
+
+
+def join(room, name, binary=True):
+    websocket = FakeSocket()
+    room.connect(websocket, name)
+    room.register_user(websocket, name, binary=binary)
+    return websocket
+
+
+def received(websocket, kind):
+    return [message for message in map(json.loads, filter(lambda frame: isinstance(frame, str), websocket.sent))
+            if message["type"] == kind]
+
+
+def test_join_storm_sends_one_user_ids_frame_per_window():
+    async def run():
+        room = make_room(presence_window=0.05)
+        first = join(room, "g0")
+        await asyncio.sleep(0.1)
+        before = len(received(first, wire.USER_IDS))
+        for i in range(1, 30):
+            join(room, f"g{i}")
+        await asyncio.sleep(0.1)
+        return received(first, wire.USER_IDS)[before:]
+
+    updates = asyncio.run(run())
+    assert updates == [wire.user_ids_message({f"g{i}": i for i in range(1, 30)})]
+
+
+def test_press_from_a_new_user_follows_their_id():
+    async def run():
+        room = make_room(presence_window=10)
+        first = join(room, "alice")
+        await asyncio.sleep(0.05)
+        second = join(room, "bob")
+        room.add_press(second, "bob", 1)
+        await asyncio.sleep(0.05)
+        room.users_flush.cancel()
+        return first
+
+    frames = asyncio.run(run()).sent
+    ids_at = next(i for i, frame in enumerate(frames) if isinstance(frame, str) and '"bob": 1' in frame)
+    press_at = next(i for i, frame in enumerate(frames) if isinstance(frame, bytes) and frame[0] == wire.PRESS_APPENDED)
+    assert ids_at < press_at
+
+
+def test_reaped_socket_is_no_longer_served():
+    async def run():
+        room = make_room()
+        websocket = join(room, "alice")
+        room.reap(-1)
+        assert not room.seen(websocket)
+        room.add_press(websocket, "alice", 1)
+        room.add_pong(websocket, 1, 1, 2)
+        room.register_user(websocket, "alice")
+        await asyncio.sleep(0)
+        return room
+
+    room = asyncio.run(run())
+    assert room.latest_presses == [] and room.members == {}
+
+
+def welcome(websocket):
+    return received(websocket, wire.WELCOME)[-1]
+
+
+def resume(room, name, token, last_seq):
+    websocket = FakeSocket()
+    room.connect(websocket, name)
+    room.register_user(websocket, name, binary=False, resume=token, last_seq=last_seq)
+    return websocket
+
+
+def press(room, name):
+    websocket = join(room, name, binary=False)
+    room.add_press(websocket, name, 1)
+
+
+def test_resume_replays_missed_events_from_the_buffer():
+    async def run():
+        room = make_room(resume_grace=30)
+        alice = join(room, "alice", binary=False)
+        room.add_press(alice, "alice", 1)
+        await asyncio.sleep(0.05)
+        token = welcome(alice)["resume"]
+        room.disconnect(alice)
+        press(room, "bob")
+        back = resume(room, "alice", token, last_seq=1)
+        await asyncio.sleep(0.05)
+        return token, back
+
+    token, back = asyncio.run(run())
+    assert welcome(back)["resumed"] and welcome(back)["resume"] == token
+    assert [event["seq"] for event in received(back, protocol.PRESS_APPENDED)] == [2]
+    assert received(back, protocol.SNAPSHOT) == []
+
+
+def test_resume_falls_back_to_a_snapshot_past_the_buffer():
+    async def run():
+        room = make_room(resume_grace=30, replay_events=1)
+        alice = join(room, "alice", binary=False)
+        room.add_press(alice, "alice", 1)
+        await asyncio.sleep(0.05)
+        token = welcome(alice)["resume"]
+        room.disconnect(alice)
+        press(room, "bob")
+        press(room, "carol")
+        back = resume(room, "alice", token, last_seq=1)
+        await asyncio.sleep(0.05)
+        return back
+
+    back = asyncio.run(run())
+    assert welcome(back)["resumed"]
+    assert received(back, protocol.PRESS_APPENDED) == []
+    assert [(event["seq"], len(event["latest_presses"])) for event in received(back, protocol.SNAPSHOT)] == [(3, 3)]
+
+
+def test_resume_with_an_unknown_token_gets_a_new_one():
+    async def run():
+        room = make_room()
+        back = resume(room, "alice", "guessed", last_seq=None)
+        await asyncio.sleep(0.05)
+        return room, back
+
+    room, back = asyncio.run(run())
+    token = welcome(back)["resume"]
+    assert not welcome(back)["resumed"] and token != "guessed"
+    assert "guessed" not in room.tokens and token in room.tokens
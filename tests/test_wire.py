@@ -0,0 +1,68 @@
+import asyncio
+import json
+from app import protocol, wire
+from app.backend import MemoryBackend
+from app.rooms import Room
+
+
+def test_press_appended_round_trip():
+    ids = {"alice": 0, "bob": 1}
+    names = {user_id: name for name, user_id in ids.items()}
+    press = protocol.make_press("bob", 1_000, 900, 123_456, None)
+    event = protocol.press_appended(7, press, "alice", "locked")
+    assert wire.decode_event(wire.encode_event(event, ids), names) == event
+
+
+def test_round_reset_and_ping_round_trip():
+    event = protocol.round_reset(8, "armed")
+    assert wire.decode_event(wire.encode_event(event, {}), {}) == event
+    assert wire.decode_event(wire.encode_ping(42), {}) == {"type": protocol.PING, "server_ns": 42}
+
+
+def test_client_frames_round_trip():
+    assert wire.decode_client(wire.encode_press(-5)) == ("button_press", {"client_ns": -5})
+    assert wire.decode_client(wire.encode_pong(1, 2)) == ("pong", {"server_ns": 1, "client_ns": 2})
+
+
+def test_user_without_id_stays_json():
+    press = protocol.make_press("carol", 1, 1, None, None)
+    assert wire.encode_event(protocol.press_appended(1, press, "carol", "armed"), {"alice": 0}) is None
+
+
+def test_json_only_events():
+    assert wire.encode_event(protocol.users(["alice"], 1), {"alice": 0}) is None
+    assert wire.encode_event(protocol.snapshot(1, [], "armed"), {}) is None
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message):
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        pass
+
+
+def test_event_without_binary_form_goes_out_as_json():
+    async def run():
+        backend = MemoryBackend()
+        room = Room("test", backend=backend, presence_window=0, resume_grace=0)
+        backend.dispatch = lambda name, event: room.apply(event)
+        websocket = FakeSocket()
+        room.connect(websocket, "alice")
+        room.register_user(websocket, "alice", binary=True)
+        # Out of range for the frame, as if it got past the input checks
+        press = protocol.make_press("alice", 1, 1, 10 ** 30, None)
+        room.submit({"kind": "press", "press": press})
+        await asyncio.sleep(0.05)
+        return room, websocket.sent
+
+    room, sent = asyncio.run(run())
+    assert room.press_seq == 1
+    appended = [json.loads(frame) for frame in sent if isinstance(frame, str) and protocol.PRESS_APPENDED in frame]
+    assert appended and appended[0]["press"]["client_ns"] == 10 ** 30